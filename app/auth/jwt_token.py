@@ -1,22 +1,52 @@
+import uuid
 import jwt
 from aiohttp import web
 from datetime import datetime, timedelta
 from app.core.config import auth_settings
 
 
-def create_jwt_token(user_id: str) -> str:
+def create_jwt_token(user_id: str, family: str = None) -> str:
+    """Short-lived access token, valid for ``ACCESS_TOKEN_TTL`` seconds."""
     payload = {
         "user_id": user_id,
-        "exp": datetime.utcnow() + timedelta(hours=1)
+        "typ": "access",
+        "fam": family or uuid.uuid4().hex,
+        "exp": datetime.utcnow() + timedelta(seconds=auth_settings.access_token_ttl)
     }
     token = jwt.encode(payload, auth_settings.jwt_secret_ket, algorithm="HS256")
     return token
 
-def decode_jwt_token(token: str) -> dict:
+def create_refresh_token(user_id: str, family: str) -> str:
+    """Single-use refresh token, valid for ``REFRESH_TOKEN_TTL`` seconds.
+
+    ``family`` ties it to the login it descends from, so a replayed token
+    can revoke every token issued since.
+    """
+    payload = {
+        "user_id": user_id,
+        "typ": "refresh",
+        "fam": family,
+        "jti": uuid.uuid4().hex,
+        "exp": datetime.utcnow() + timedelta(seconds=auth_settings.refresh_token_ttl)
+    }
+    return jwt.encode(payload, auth_settings.jwt_secret_ket, algorithm="HS256")
+
+def create_token_pair(user_id: str, family: str = None) -> dict:
+    family = family or uuid.uuid4().hex
+    return {
+        "token": create_jwt_token(user_id, family),
+        "refresh_token": create_refresh_token(user_id, family),
+        "expires_in": auth_settings.access_token_ttl,
+    }
+
+def decode_jwt_token(token: str, token_type: str = "access") -> dict:
     try:
         payload = jwt.decode(token, auth_settings.jwt_secret_ket, algorithms=["HS256"])
-        return payload
     except jwt.ExpiredSignatureError:
         raise web.HTTPUnauthorized(reason="Token has expired")
     except jwt.InvalidTokenError:
-        raise web.HTTPUnauthorized(reason="Invalid token")
\ No newline at end of file
+        raise web.HTTPUnauthorized(reason="Invalid token")
+    # Tokens issued before refresh tokens existed carry no type and are access tokens.
+    if payload.get("typ", "access") != token_type:
+        raise web.HTTPUnauthorized(reason="Invalid token")
+    return payload
@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from app.core.config import auth_settings
+from app.db.database import objects
+from app.models.model import RevokedToken
+
+logger = logging.getLogger(__name__)
+
+# Rows are fetched again for this long after they were first seen, so a
+# revocation whose transaction committed out of order isn't missed.
+SYNC_OVERLAP = timedelta(seconds=30)
+PRUNE_INTERVAL = 3600.0
+
+
+def _timestamp(value):
+    return (value - datetime(1970, 1, 1)).total_seconds()
+
+
+class RevocationList:
+    """In-memory mirror of the ``revoked_token`` table.
+
+    Maps the 16-byte form of each revoked token or family id to its expiry,
+    so checking a token is a dict lookup. Revocations made by this worker are
+    added straight away; the others arrive with the next :meth:`sync`, every
+    ``sync_interval`` seconds. Expired entries are dropped, which keeps the
+    mirror as small as the set of tokens that could still be presented.
+    """
+
+    def __init__(self, sync_interval):
+        self.sync_interval = sync_interval
+        self._revoked = {}
+        self._synced_until = None
+        self._pruned_at = 0.0
+        self._task = None
+        self.counters = {
+            'syncs': 0,
+            'sync_errors': 0,
+            'revocations': 0,
+            'reuse_detected': 0,
+        }
+
+    @staticmethod
+    def _key(token_id):
+        return uuid.UUID(token_id).bytes
+
+    def _add(self, token_id, expires_at):
+        self._revoked[self._key(token_id)] = expires_at
+
+    def is_revoked(self, token_id):
+        if token_id is None:
+            return False
+        expires_at = self._revoked.get(self._key(token_id))
+        return expires_at is not None and expires_at > time.time()
+
+    async def _insert(self, token_id, expires_at):
+        query = (RevokedToken
+                 .insert(token_id=token_id, expires_at=datetime.utcfromtimestamp(expires_at))
+                 .on_conflict_ignore()
+                 .returning(RevokedToken.id))
+        inserted = await objects.execute(query)
+        self._add(token_id, expires_at)
+        return inserted is not None
+
+    async def consume(self, token_id, expires_at):
+        """Mark a refresh token used; ``False`` if it already was, by any worker."""
+        if self.is_revoked(token_id) or not await self._insert(token_id, expires_at):
+            self.counters['reuse_detected'] += 1
+            return False
+        return True
+
+    async def revoke(self, token_id, expires_at):
+        """Revoke a token or family id until ``expires_at`` (a Unix timestamp)."""
+        await self._insert(token_id, expires_at)
+        self.counters['revocations'] += 1
+
+    async def sync(self):
+        now = datetime.utcnow()
+        query = RevokedToken.select(RevokedToken.token_id, RevokedToken.expires_at, RevokedToken.revoked_at)
+        query = query.where(RevokedToken.expires_at > now)
+        if self._synced_until is not None:
+            query = query.where(RevokedToken.revoked_at > self._synced_until - SYNC_OVERLAP)
+        for row in await objects.execute(query):
+            self._add(row.token_id.hex, _timestamp(row.expires_at))
+            if self._synced_until is None or row.revoked_at > self._synced_until:
+                self._synced_until = row.revoked_at
+        expired = [key for key, expires_at in self._revoked.items() if expires_at <= time.time()]
+        for key in expired:
+            del self._revoked[key]
+        self.counters['syncs'] += 1
+
+        if time.monotonic() - self._pruned_at >= PRUNE_INTERVAL:
+            self._pruned_at = time.monotonic()
+            await objects.execute(RevokedToken.delete().where(RevokedToken.expires_at <= now))
+
+    async def _run(self):
+        while True:
+            try:
+                await self.sync()
+            except Exception as e:
+                self.counters['sync_errors'] += 1
+                logger.error("Token revocation sync failed: %s", str(e))
+            await asyncio.sleep(self.sync_interval)
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self):
+        return {**self.counters, 'revoked': len(self._revoked)}
+
+
+revocation_list = RevocationList(sync_interval=auth_settings.token_revocation_sync_interval)
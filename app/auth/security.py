@@ -1,11 +1,19 @@
+import asyncio
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor
+
 import bcrypt
 
+from app.core.config import auth_settings
+
 users = {}
 
 
-def generate_password_hash(password):
+def generate_password_hash(password, rounds=None):
     password_bin = password.encode('utf-8')
-    hashed = bcrypt.hashpw(password_bin, bcrypt.gensalt())
+    salt = bcrypt.gensalt(rounds=rounds or auth_settings.bcrypt_rounds)
+    hashed = bcrypt.hashpw(password_bin, salt)
     return hashed.decode('utf-8')
 
 
@@ -14,3 +22,92 @@ def check_password_hash(plain_password, password_hash):
     password_hash_bin = password_hash.encode('utf-8')
     is_correct = bcrypt.checkpw(plain_password_bin, password_hash_bin)
     return is_correct
+
+
+def _init_hashing_worker():
+    # Forked workers inherit the event loop's signal wakeup fd; without this a
+    # Ctrl-C delivered to the whole process group would reach the parent's
+    # loop once per worker and cut its graceful shutdown short.
+    signal.set_wakeup_fd(-1)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+
+class HashingQueueFull(Exception):
+    """Raised when too many hashing jobs are already waiting for a worker."""
+
+
+class HashingService:
+    """Runs bcrypt in a process pool so it never blocks the event loop.
+
+    At most ``workers`` jobs run at once and at most ``queue_size`` more may
+    wait for a free worker; anything beyond that is rejected with
+    :class:`HashingQueueFull` instead of piling up behind the pool.
+    """
+
+    def __init__(self, workers, queue_size, rounds):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.rounds = rounds
+        self._executor = None
+        self._semaphore = None
+        self._waiting = 0
+        self.counters = {
+            'hash_calls': 0,
+            'verify_calls': 0,
+            'rejected': 0,
+            'queue_wait_seconds': 0.0,
+            'hash_seconds': 0.0,
+        }
+
+    async def hash(self, password):
+        self.counters['hash_calls'] += 1
+        return await self._run(generate_password_hash, password, self.rounds)
+
+    async def verify(self, plain_password, password_hash):
+        self.counters['verify_calls'] += 1
+        return await self._run(check_password_hash, plain_password, password_hash)
+
+    async def _run(self, func, *args):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.workers)
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_hashing_worker)
+        if self._semaphore.locked() and self._waiting >= self.queue_size:
+            self.counters['rejected'] += 1
+            raise HashingQueueFull()
+
+        queued_at = time.perf_counter()
+        self._waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+        started_at = time.perf_counter()
+        self.counters['queue_wait_seconds'] += started_at - queued_at
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, func, *args)
+        finally:
+            self.counters['hash_seconds'] += time.perf_counter() - started_at
+            self._semaphore.release()
+
+    def stats(self):
+        return {
+            **self.counters,
+            'waiting': self._waiting,
+            'workers': self.workers,
+            'queue_size': self.queue_size,
+        }
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            self._semaphore = None
+
+
+hashing_service = HashingService(
+    workers=auth_settings.hash_pool_workers,
+    queue_size=auth_settings.hash_queue_size,
+    rounds=auth_settings.bcrypt_rounds,
+)
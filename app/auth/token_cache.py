@@ -0,0 +1,29 @@
+import hashlib
+
+from app.core.config import auth_settings
+from app.utils.lru_cache import ExpiringLRUCache
+
+
+class TokenCache(ExpiringLRUCache):
+    """Bounded LRU cache of already verified JWT payloads.
+
+    Entries are keyed on a SHA-256 digest of the raw token, so the cache never
+    holds bearer tokens themselves, and each entry is dropped once the token's
+    ``exp`` claim has passed.
+    """
+
+    @staticmethod
+    def _key(token):
+        return hashlib.sha256(token.encode('utf-8')).digest()
+
+    def get(self, token):
+        return super().get(self._key(token))
+
+    def put(self, token, payload):
+        expires_at = payload.get('exp')
+        if expires_at is None:
+            return
+        self.set(self._key(token), payload, expires_at=expires_at)
+
+
+token_cache = TokenCache(max_size=auth_settings.token_cache_size)
@@ -7,6 +7,13 @@ load_dotenv()
 
 class Authentication(BaseSettings):
     jwt_secret_ket: str = str(os.environ.get("JWT_SECRET_KEY"))
+    bcrypt_rounds: int = os.environ.get("BCRYPT_ROUNDS", 12)
+    hash_pool_workers: int = os.environ.get("HASH_POOL_WORKERS", os.cpu_count() or 1)
+    hash_queue_size: int = os.environ.get("HASH_QUEUE_SIZE", 64)
+    token_cache_size: int = os.environ.get("TOKEN_CACHE_SIZE", 10000)
+    access_token_ttl: int = os.environ.get("ACCESS_TOKEN_TTL", 900)
+    refresh_token_ttl: int = os.environ.get("REFRESH_TOKEN_TTL", 30 * 24 * 3600)
+    token_revocation_sync_interval: float = os.environ.get("TOKEN_REVOCATION_SYNC_INTERVAL", 5.0)
 
 
 auth_settings = Authentication()
@@ -18,6 +25,95 @@ class DbSettings(BaseSettings):
     db_name: str = os.environ.get("DB_DATABASE")
     db_user: str = os.environ.get("DB_USERNAME")
     db_pass: str = os.environ.get("DB_PASSWORD")
+    db_strict_mode: bool = os.environ.get("DB_STRICT_MODE", False)
+    db_pool_min_size: int = os.environ.get("DB_POOL_MIN_SIZE", 1)
+    db_pool_max_size: int = os.environ.get("DB_POOL_MAX_SIZE", 10)
+    db_pool_acquire_timeout: float = os.environ.get("DB_POOL_ACQUIRE_TIMEOUT", 5.0)
+    db_pool_max_lifetime: float = os.environ.get("DB_POOL_MAX_LIFETIME", 3600.0)
+    db_statement_timeout: int = os.environ.get("DB_STATEMENT_TIMEOUT", 0)
+    db_export_fetch_size: int = os.environ.get("DB_EXPORT_FETCH_SIZE", 500)
+    db_prepared_statements: bool = os.environ.get("DB_PREPARED_STATEMENTS", True)
+    db_batch_window: float = os.environ.get("DB_BATCH_WINDOW", 0.0)
+    db_batch_max_size: int = os.environ.get("DB_BATCH_MAX_SIZE", 100)
+    db_replica_dsn: str = os.environ.get("DB_REPLICA_DSN", "")
+    db_replica_max_lag: float = os.environ.get("DB_REPLICA_MAX_LAG", 5.0)
+    db_replica_check_interval: float = os.environ.get("DB_REPLICA_CHECK_INTERVAL", 2.0)
+    db_read_your_writes_window: float = os.environ.get("DB_READ_YOUR_WRITES_WINDOW", 5.0)
 
 
 db_settings = DbSettings()
+
+
+class CacheSettings(BaseSettings):
+    device_cache_size: int = os.environ.get("DEVICE_CACHE_SIZE", 10000)
+    device_cache_ttl: float = os.environ.get("DEVICE_CACHE_TTL", 60.0)
+
+
+cache_settings = CacheSettings()
+
+
+class TelemetrySettings(BaseSettings):
+    telemetry_buffer_size: int = os.environ.get("TELEMETRY_BUFFER_SIZE", 100000)
+    telemetry_flush_rows: int = os.environ.get("TELEMETRY_FLUSH_ROWS", 5000)
+    telemetry_flush_interval: float = os.environ.get("TELEMETRY_FLUSH_INTERVAL", 1.0)
+    telemetry_insert_chunk: int = os.environ.get("TELEMETRY_INSERT_CHUNK", 1000)
+    telemetry_max_batch: int = os.environ.get("TELEMETRY_MAX_BATCH", 10000)
+
+
+telemetry_settings = TelemetrySettings()
+
+
+class FeedSettings(BaseSettings):
+    feed_channel: str = os.environ.get("FEED_CHANNEL", "device_changes")
+    feed_max_pending: int = os.environ.get("FEED_MAX_PENDING", 1000)
+    feed_publish_queue_size: int = os.environ.get("FEED_PUBLISH_QUEUE_SIZE", 10000)
+
+
+feed_settings = FeedSettings()
+
+
+class LoggingSettings(BaseSettings):
+    log_level: str = os.environ.get("LOG_LEVEL", "INFO")
+    log_levels: str = os.environ.get("LOG_LEVELS", "")
+    log_format: str = os.environ.get("LOG_FORMAT", "text")
+    log_queue_size: int = os.environ.get("LOG_QUEUE_SIZE", 10000)
+    access_log_sample_rate: float = os.environ.get("ACCESS_LOG_SAMPLE_RATE", 1.0)
+
+
+logging_settings = LoggingSettings()
+
+
+class ServerSettings(BaseSettings):
+    server_host: str = os.environ.get("SERVER_HOST", "0.0.0.0")
+    server_port: int = os.environ.get("SERVER_PORT", 8000)
+    web_workers: int = os.environ.get("WEB_WORKERS", 1)
+    reuse_port: bool = os.environ.get("REUSE_PORT", True)
+    shutdown_timeout: float = os.environ.get("SHUTDOWN_TIMEOUT", 30.0)
+
+
+server_settings = ServerSettings()
+
+
+class AdmissionSettings(BaseSettings):
+    admission_enabled: bool = os.environ.get("ADMISSION_ENABLED", True)
+    admission_auth_limit: int = os.environ.get("ADMISSION_AUTH_LIMIT", 32)
+    admission_read_limit: int = os.environ.get("ADMISSION_READ_LIMIT", 256)
+    admission_write_limit: int = os.environ.get("ADMISSION_WRITE_LIMIT", 128)
+    admission_queue_size: int = os.environ.get("ADMISSION_QUEUE_SIZE", 256)
+    admission_queue_timeout: float = os.environ.get("ADMISSION_QUEUE_TIMEOUT", 1.0)
+    rate_limit_enabled: bool = os.environ.get("RATE_LIMIT_ENABLED", False)
+    rate_limit_rate: float = os.environ.get("RATE_LIMIT_RATE", 20.0)
+    rate_limit_burst: float = os.environ.get("RATE_LIMIT_BURST", 40.0)
+    rate_limit_users: int = os.environ.get("RATE_LIMIT_USERS", 100000)
+
+
+admission_settings = AdmissionSettings()
+
+
+class CompressionSettings(BaseSettings):
+    compression_enabled: bool = os.environ.get("COMPRESSION_ENABLED", True)
+    compression_min_size: int = os.environ.get("COMPRESSION_MIN_SIZE", 1024)
+    compression_executor_size: int = os.environ.get("COMPRESSION_EXECUTOR_SIZE", 65536)
+
+
+compression_settings = CompressionSettings()
@@ -0,0 +1,107 @@
+import atexit
+import logging
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+
+from app.core.config import logging_settings
+from app.utils.serialization import dumps
+
+TEXT_FORMAT = '%(asctime)s %(levelname)s %(name)s %(message)s'
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as one JSON object per line.
+
+    Fields passed as ``extra={'fields': {...}}`` are merged into the object,
+    so access lines stay machine-readable without parsing the message.
+    """
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        fields = getattr(record, 'fields', None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return dumps(entry).decode('utf-8')
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Hands records to the listener thread without ever blocking the caller.
+
+    The stock handler formats every record on the calling thread before
+    queueing it; the listener here runs in the same process, so records are
+    passed through untouched and all formatting happens on its thread. When
+    the queue is full the record is dropped and counted rather than waited on.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def parse_levels(spec):
+    """Parse ``LOG_LEVELS`` such as ``"peewee=WARNING,aiohttp.access=INFO"``."""
+    levels = {}
+    for item in spec.split(','):
+        if not item.strip():
+            continue
+        name, _, level = item.partition('=')
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+_listener = None
+_queue_handler = None
+
+
+def setup_logging(settings=logging_settings):
+    """Route all logging through a queue drained by a background thread.
+
+    Safe to call more than once; only the first call installs the handlers.
+    The listener is stopped at interpreter exit, after it has written out
+    everything still queued.
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return _listener
+
+    stream_handler = logging.StreamHandler(sys.stderr)
+    if settings.log_format == 'json':
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    log_queue = queue.Queue(maxsize=settings.log_queue_size)
+    _queue_handler = NonBlockingQueueHandler(log_queue)
+    root = logging.getLogger()
+    root.handlers[:] = [_queue_handler]
+    root.setLevel(settings.log_level.upper())
+    for name, level in parse_levels(settings.log_levels).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    return _listener
+
+
+def log_stats():
+    if _queue_handler is None:
+        return {'queued': 0, 'dropped': 0}
+    return {'queued': _queue_handler.queue.qsize(), 'dropped': _queue_handler.dropped}
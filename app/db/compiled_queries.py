@@ -0,0 +1,163 @@
+import itertools
+import weakref
+
+import peewee
+from peewee import Value
+from psycopg2 import errors
+
+from app.core.config import db_settings
+from app.db.database import database
+
+
+class Param:
+    """Placeholder for a value bound when a compiled query runs."""
+    __slots__ = ('name', 'db_value')
+
+    def __init__(self, name, db_value):
+        self.name = name
+        self.db_value = db_value
+
+
+def param(field, name=None):
+    """A bound parameter for ``field``, looked up as ``name`` (the field name by default).
+
+    Values go through ``field.db_value`` at execution time, just as peewee
+    converts them when it builds a query.
+    """
+    return Value(Param(name or field.name, field.db_value), converter=False)
+
+
+def array_param(field, name=None):
+    """Like :func:`param`, for a list of ``field`` values bound as one array (``= ANY(...)``)."""
+    def db_value(values):
+        return [field.db_value(value) for value in values]
+    return Value(Param(name or field.name, db_value), converter=False)
+
+
+class CompiledQuery:
+    """The SQL of one query shape, generated once and run with bound parameters.
+
+    ``query`` is built with :func:`param` placeholders instead of values. Its
+    RETURNING (or SELECT) list must be model fields; rows come back as model
+    instances, built the way peewee builds them.
+    """
+
+    def __init__(self, name, query):
+        self.name = name
+        self.model = query.model
+        self.sql, params = query.sql()
+        self.params = params
+        self.fields = list(query._returning or ())
+        self.prepare_sql = self._numbered(self.sql)
+        placeholders = ', '.join(['%s'] * len(params))
+        self.execute_sql = f'EXECUTE {name}({placeholders})' if params else f'EXECUTE {name}'
+
+    @staticmethod
+    def _numbered(sql):
+        parts = sql.split('%s')
+        numbered = [parts[0]]
+        for index, part in enumerate(parts[1:], 1):
+            numbered.append(f'${index}{part}')
+        return ''.join(numbered)
+
+    def bind(self, values):
+        return [p.db_value(values[p.name]) if isinstance(p, Param) else p for p in self.params]
+
+    def instance(self, row):
+        data = {field.name: field.python_value(value) for field, value in zip(self.fields, row)}
+        instance = self.model(__no_default__=1, **data)
+        instance._dirty.clear()
+        return instance
+
+
+# Shared by every cache so that statement names never clash on a connection.
+_statement_names = itertools.count(1)
+
+
+class QueryCache:
+    """Compiled queries keyed by shape, plus the statements prepared on each connection.
+
+    With ``DB_PREPARED_STATEMENTS`` on, a shape is ``PREPARE``d the first
+    time it runs on a pooled connection and ``EXECUTE``d from then on, so
+    Postgres skips parsing and planning as well. psycopg2 has no
+    protocol-level prepared statements, hence the SQL-level ones; turn them
+    off behind a transaction-pooling proxy such as PgBouncer, where the next
+    statement may land on another server connection.
+    """
+
+    def __init__(self, prepared_statements):
+        self.prepared_statements = prepared_statements
+        self._queries = {}
+        self._prepared = weakref.WeakKeyDictionary()
+        self.counters = {'hits': 0, 'misses': 0, 'executions': 0, 'prepares': 0}
+
+    def compile(self, key, build):
+        """Return the compiled query for ``key``, calling ``build()`` only the first time."""
+        compiled = self._queries.get(key)
+        if compiled is not None:
+            self.counters['hits'] += 1
+            return compiled
+        self.counters['misses'] += 1
+        compiled = self._queries[key] = CompiledQuery(f'compiled_{next(_statement_names)}', build())
+        return compiled
+
+    async def execute(self, compiled, values, db=database):
+        """Run ``compiled`` with ``values`` on ``db`` and return the resulting model instances."""
+        params = compiled.bind(values)
+        self.counters['executions'] += 1
+        with peewee.__exception_wrapper__:
+            cursor = await db.cursor_async()
+            try:
+                if self.prepared_statements:
+                    await self._execute_prepared(cursor, compiled, params)
+                else:
+                    await cursor.execute(compiled.sql, params)
+                rows = await cursor.fetchall()
+            finally:
+                await cursor.release()
+        return [compiled.instance(row) for row in rows]
+
+    async def _execute_prepared(self, cursor, compiled, params):
+        prepared = self._prepared.setdefault(cursor.connection, set())
+        if compiled.name not in prepared:
+            await cursor.execute(f'PREPARE {compiled.name} AS {compiled.prepare_sql}')
+            prepared.add(compiled.name)
+            self.counters['prepares'] += 1
+        try:
+            await cursor.execute(compiled.execute_sql, params)
+        except errors.InvalidSqlStatementName:
+            # e.g. a DEALLOCATE ALL on the session; prepare again next time.
+            prepared.discard(compiled.name)
+            raise
+
+    def stats(self):
+        return {**self.counters, 'shapes': len(self._queries)}
+
+
+query_cache = QueryCache(db_settings.db_prepared_statements)
+
+
+async def get(model, **conditions):
+    """Compiled ``objects.get(model, **conditions)``: one instance or ``model.DoesNotExist``."""
+    def build():
+        where = [getattr(model, name) == param(getattr(model, name)) for name in conditions]
+        return model.select().where(*where)
+
+    compiled = query_cache.compile(('get', model, tuple(conditions)), build)
+    rows = await query_cache.execute(compiled, conditions)
+    if not rows:
+        raise model.DoesNotExist
+    return rows[0]
+
+
+async def create(model, **data):
+    """Compiled ``objects.create(model, **data)``: INSERT ... RETURNING the new row."""
+    values = model(**data).__data__
+
+    def build():
+        fields = model._meta.fields
+        return (model.insert({fields[name]: param(fields[name]) for name in values})
+                .returning(*model._meta.sorted_fields))
+
+    compiled = query_cache.compile(('create', model, tuple(values)), build)
+    return (await query_cache.execute(compiled, values))[0]
@@ -1,20 +1,191 @@
-import logging
+import asyncio
+import contextvars
+import time
 
-from peewee_async import PostgresqlDatabase, Manager
+from peewee_async import PooledPostgresqlDatabase, AsyncPostgresqlConnection, Manager
+from psycopg2.extensions import parse_dsn
 from app.core.config import db_settings
+from app.utils.metrics import registry
 
-logging.basicConfig(level=logging.DEBUG)
-database = PostgresqlDatabase(
+query_latency = registry.histogram('app_db_query_duration_seconds', 'Database query execution time')
+
+# Set by the metrics middleware to a [query_count, query_seconds] list for
+# the request being handled; queries outside a request leave it unset.
+request_queries = contextvars.ContextVar('request_queries', default=None)
+
+
+class PoolAcquireTimeout(Exception):
+    """Raised when no pooled connection became free within the acquire timeout."""
+
+
+class StatsPostgresqlConnection(AsyncPostgresqlConnection):
+    """aiopg pool wrapper that bounds acquire time and records pool and query statistics."""
+
+    def __init__(self, *, acquire_timeout=None, **kwargs):
+        super().__init__(**kwargs)
+        self.acquire_timeout = acquire_timeout
+        self.waiters = 0
+        self.counters = {
+            'acquires': 0,
+            'acquire_timeouts': 0,
+            'acquire_seconds': 0.0,
+            'acquire_seconds_max': 0.0,
+            'queries': 0,
+            'query_seconds': 0.0,
+        }
+
+    async def acquire(self):
+        started_at = time.perf_counter()
+        self.waiters += 1
+        try:
+            conn = await asyncio.wait_for(self.pool.acquire(), self.acquire_timeout)
+        except asyncio.TimeoutError:
+            self.counters['acquire_timeouts'] += 1
+            raise PoolAcquireTimeout(
+                f"No database connection available within {self.acquire_timeout}s")
+        finally:
+            self.waiters -= 1
+        elapsed = time.perf_counter() - started_at
+        self.counters['acquires'] += 1
+        self.counters['acquire_seconds'] += elapsed
+        self.counters['acquire_seconds_max'] = max(self.counters['acquire_seconds_max'], elapsed)
+        return conn
+
+    async def cursor(self, conn=None, *args, **kwargs):
+        # Every async query, whether it comes through the Manager or a raw
+        # cursor_async(), runs on a cursor handed out here.
+        cursor = await super().cursor(conn, *args, **kwargs)
+        execute = cursor.execute
+
+        async def timed_execute(operation, parameters=None, **options):
+            started_at = time.perf_counter()
+            try:
+                return await execute(operation, parameters, **options)
+            finally:
+                self._record_query(time.perf_counter() - started_at)
+
+        cursor.execute = timed_execute
+        return cursor
+
+    def _record_query(self, elapsed):
+        self.counters['queries'] += 1
+        self.counters['query_seconds'] += elapsed
+        query_latency.observe(elapsed)
+        current = request_queries.get()
+        if current is not None:
+            current[0] += 1
+            current[1] += elapsed
+
+    def stats(self):
+        size = self.pool.size if self.pool else 0
+        idle = self.pool.freesize if self.pool else 0
+        return {
+            **self.counters,
+            'size': size,
+            'in_use': size - idle,
+            'idle': idle,
+            'waiters': self.waiters,
+        }
+
+
+class StatsPooledPostgresqlDatabase(PooledPostgresqlDatabase):
+    """Pooled database whose async pool is sized, recycled and timed from settings."""
+
+    def init(self, database, **kwargs):
+        self.acquire_timeout = kwargs.pop('acquire_timeout', None)
+        self.max_lifetime = kwargs.pop('max_lifetime', -1)
+        super().init(database, **kwargs)
+        self._async_conn_cls = StatsPostgresqlConnection
+
+    async def cursor_async(self):
+        # Same as the base class, except that an acquire timeout propagates
+        # as is: the base class closes the whole pool on any error here, which
+        # would kill every in-flight connection and silently drop open
+        # transactions to autocommit on a fresh pool.
+        await self.connect_async(loop=self._loop)
+        conn = self.transaction_conn_async() if self.transaction_depth_async() > 0 else None
+        try:
+            return await self._async_conn.cursor(conn=conn)
+        except PoolAcquireTimeout:
+            raise
+        except:
+            await self.close_async()
+            raise
+
+    @property
+    def connect_params_async(self):
+        kwargs = super().connect_params_async
+        kwargs.update({
+            'pool_recycle': self.max_lifetime,
+            'acquire_timeout': self.acquire_timeout,
+        })
+        return kwargs
+
+
+def _connect_options():
+    if db_settings.db_statement_timeout:
+        return {'options': f'-c statement_timeout={db_settings.db_statement_timeout}'}
+    return {}
+
+
+def _create_database(database, user, password, host, port):
+    return StatsPooledPostgresqlDatabase(
+        database=database,
+        user=user,
+        password=password,
+        host=host,
+        port=port,
+        min_connections=db_settings.db_pool_min_size,
+        max_connections=db_settings.db_pool_max_size,
+        acquire_timeout=db_settings.db_pool_acquire_timeout,
+        max_lifetime=db_settings.db_pool_max_lifetime,
+        **_connect_options()
+    )
+
+
+def _create_replica_database(dsn):
+    # Anything the DSN leaves out is taken from the primary's settings.
+    params = parse_dsn(dsn)
+    return _create_database(
+        database=params.get('dbname', db_settings.db_name),
+        user=params.get('user', db_settings.db_user),
+        password=params.get('password', db_settings.db_pass),
+        host=params.get('host', db_settings.db_host),
+        port=params.get('port', db_settings.db_port),
+    )
+
+
+database = _create_database(
     database=db_settings.db_name,
     user=db_settings.db_user,
     password=db_settings.db_pass,
     host=db_settings.db_host,
-    port=db_settings.db_port
+    port=db_settings.db_port,
 )
 
+# Optional read replica (DB_REPLICA_DSN); app/db/routing.py decides when reads use it.
+replica_database = _create_replica_database(db_settings.db_replica_dsn) if db_settings.db_replica_dsn else None
+
 def close():
     if not database.is_closed():
         database.close()
 
+
+def pool_stats(db=database):
+    conn = db._async_conn
+    stats = conn.stats() if conn else {'size': 0, 'in_use': 0, 'idle': 0, 'waiters': 0}
+    stats.update({
+        'min_size': db.min_connections,
+        'max_size': db.max_connections,
+    })
+    return stats
+
 objects = Manager(database)
-database.set_allow_sync(True)
+replica_objects = Manager(replica_database) if replica_database is not None else None
+# In strict mode every synchronous query raises, so a blocking call that
+# slips into a request handler fails loudly instead of stalling the loop.
+# Scripts that legitimately need sync access wrap it in `database.allow_sync()`.
+database.set_allow_sync(not db_settings.db_strict_mode)
+if replica_database is not None:
+    # Only ever read from asynchronously.
+    replica_database.set_allow_sync(False)
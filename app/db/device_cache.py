@@ -0,0 +1,90 @@
+from app.core.config import cache_settings, db_settings
+from app.db.loaders import device_loader, replica_device_loader
+from app.db.routing import reading_from_replica
+from app.models.model import Device
+from app.utils.lru_cache import ExpiringLRUCache
+from app.utils.serialization import dumps, model_serializer
+
+
+class DeviceCache(ExpiringLRUCache):
+    """Read-through cache of serialized device responses.
+
+    Values are ``(owner_id, version, body)`` tuples keyed on the device id,
+    ``body`` being the encoded JSON bytes, so a hit can still be checked for
+    ownership and answered with an ETag without touching the database. Write
+    paths call :meth:`invalidate` for the ids they changed. The other workers
+    evict them when the matching device events arrive over Postgres NOTIFY
+    (see ``device_events``), so every write path must publish its events too.
+
+    Devices invalidated within the last ``replica_window`` seconds are
+    remembered: the replica may not have their new row yet, so
+    :func:`cached_device` reads them from the primary.
+    """
+
+    def __init__(self, max_size, ttl, loader=None, replica_window=0.0):
+        super().__init__(max_size, ttl)
+        self.loader = loader
+        self.counters['invalidations'] = 0
+        self.generation = 0
+        self._recently_invalidated = ExpiringLRUCache(max_size, replica_window)
+
+    @staticmethod
+    def _key(device_id):
+        # The integer id, so that '005962' from a URL and 5962 from a write
+        # are the same entry; None for ids that can't be a device.
+        key = Device.id.db_value(device_id)
+        return key if isinstance(key, int) else None
+
+    def put(self, device_id, owner_id, version, body, generation):
+        # An invalidation that ran while the row was being read may have been
+        # for this device; filling now could resurrect the stale version.
+        key = self._key(device_id)
+        if generation != self.generation or key is None:
+            return
+        self.set(key, (owner_id, version, body))
+
+    def lookup(self, device_id):
+        return self.get(self._key(device_id))
+
+    def recently_invalidated(self, device_id):
+        return self._recently_invalidated.get(self._key(device_id)) is not None
+
+    def invalidate(self, *device_ids):
+        self.generation += 1
+        for device_id in device_ids:
+            key = self._key(device_id)
+            if key is None:
+                continue
+            self.pop(key)
+            self._recently_invalidated.set(key, True)
+            self.counters['invalidations'] += 1
+        if self.loader is not None:
+            # A lookup already in flight may have read the old row.
+            self.loader.forget(*device_ids)
+
+
+device_cache = DeviceCache(
+    max_size=cache_settings.device_cache_size,
+    ttl=cache_settings.device_cache_ttl,
+    loader=device_loader,
+    # The replica is used while its lag, checked this often, is within DB_REPLICA_MAX_LAG.
+    replica_window=db_settings.db_replica_max_lag + db_settings.db_replica_check_interval,
+)
+
+
+async def cached_device(device_id):
+    """Return ``(owner_id, version, body)`` for a device, reading through the cache.
+
+    Raises ``Device.DoesNotExist`` when there is no such device.
+    """
+    cached = device_cache.lookup(device_id)
+    if cached is not None:
+        return cached
+    generation = device_cache.generation
+    if reading_from_replica.get() and not device_cache.recently_invalidated(device_id):
+        device = await replica_device_loader.load(device_id)
+    else:
+        device = await device_loader.load(device_id)
+    body = dumps(model_serializer(Device)(device))
+    device_cache.put(device_id, device.api_user_id_id, device.version, body, generation)
+    return device.api_user_id_id, device.version, body
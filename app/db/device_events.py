@@ -0,0 +1,194 @@
+import asyncio
+import json
+import logging
+from collections import OrderedDict
+
+import aiopg
+
+from app.core.config import feed_settings
+from app.db.database import database
+from app.db.device_cache import device_cache
+
+logger = logging.getLogger(__name__)
+
+# NOTIFY payloads are capped at 8000 bytes; stay well below that.
+MAX_PAYLOAD_BYTES = 7000
+
+
+class DeviceFeedSubscriber:
+    """Pending events for one WebSocket client.
+
+    Events are coalesced per device, so a client that falls behind only gets
+    each device's latest change. A client that still lets more than
+    ``max_pending`` devices pile up is marked ``dropped`` and disconnected.
+    """
+
+    def __init__(self, user_id, max_pending):
+        self.user_id = str(user_id)
+        self.max_pending = max_pending
+        self.dropped = False
+        self._pending = OrderedDict()
+        self._ready = asyncio.Event()
+
+    def push(self, event):
+        device_id = event['device']['id'] if 'device' in event else event['id']
+        self._pending.pop(device_id, None)
+        self._pending[device_id] = event
+        if len(self._pending) > self.max_pending:
+            self.dropped = True
+            self._pending.clear()
+        self._ready.set()
+
+    async def next_events(self):
+        await self._ready.wait()
+        self._ready.clear()
+        events = list(self._pending.values())
+        self._pending.clear()
+        return events
+
+
+class DeviceEvents:
+    """Device change events shared across workers over Postgres LISTEN/NOTIFY.
+
+    Handlers :meth:`publish` events; a single publisher task per worker sends
+    them in order, batching whatever has queued up into as few NOTIFYs as
+    possible. Each worker holds one dedicated LISTEN connection and fans
+    every notification out in memory to its local subscribers, and also
+    evicts updated or deleted devices from its local device cache.
+    """
+
+    def __init__(self, channel, max_pending, publish_queue_size):
+        self.channel = channel
+        self.max_pending = max_pending
+        self.publish_queue_size = publish_queue_size
+        self._subscribers = {}
+        self._outbox = None
+        self._tasks = []
+        self._listen_conn = None
+        self.counters = {
+            'published': 0,
+            'publish_dropped': 0,
+            'notifications': 0,
+            'delivered': 0,
+            'subscribers_dropped': 0,
+        }
+
+    def subscribe(self, user_id):
+        subscriber = DeviceFeedSubscriber(user_id, self.max_pending)
+        self._subscribers.setdefault(subscriber.user_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        subscribers = self._subscribers.get(subscriber.user_id)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self._subscribers[subscriber.user_id]
+        if subscriber.dropped:
+            self.counters['subscribers_dropped'] += 1
+
+    def publish(self, user_id, events):
+        if self._outbox is None or not events:
+            return
+        for event in events:
+            try:
+                self._outbox.put_nowait((str(user_id), event))
+                self.counters['published'] += 1
+            except asyncio.QueueFull:
+                self.counters['publish_dropped'] += 1
+
+    def _dispatch(self, payload):
+        message = json.loads(payload)
+        self.counters['notifications'] += 1
+        events = message['events']
+        stale_ids = [event['device']['id'] if 'device' in event else event['id']
+                     for event in events if event['event'] != 'created']
+        if stale_ids:
+            device_cache.invalidate(*stale_ids)
+        for subscriber in list(self._subscribers.get(message['user_id'], ())):
+            for event in events:
+                subscriber.push(event)
+            self.counters['delivered'] += len(events)
+
+    def _payloads(self, items):
+        """Group queued (user_id, event) pairs into NOTIFY payloads per user."""
+        by_user = OrderedDict()
+        for user_id, event in items:
+            by_user.setdefault(user_id, []).append(event)
+        for user_id, events in by_user.items():
+            batch, size = [], 0
+            for event in events:
+                encoded = json.dumps(event)
+                if batch and size + len(encoded) > MAX_PAYLOAD_BYTES:
+                    yield json.dumps({'user_id': user_id, 'events': batch})
+                    batch, size = [], 0
+                batch.append(event)
+                size += len(encoded) + 2
+            yield json.dumps({'user_id': user_id, 'events': batch})
+
+    async def _publisher(self):
+        while True:
+            items = [await self._outbox.get()]
+            while not self._outbox.empty():
+                items.append(self._outbox.get_nowait())
+            try:
+                cursor = await database.cursor_async()
+                try:
+                    for payload in self._payloads(items):
+                        await cursor.execute('SELECT pg_notify(%s, %s)', (self.channel, payload))
+                finally:
+                    await cursor.release()
+            except Exception as e:
+                logger.error("Publishing device events failed: %s", str(e))
+
+    async def _listener(self):
+        params = dict(database.connect_params)
+        delay = 1
+        while True:
+            try:
+                async with aiopg.connect(database=database.database, **params) as conn:
+                    self._listen_conn = conn
+                    async with conn.cursor() as cursor:
+                        await cursor.execute(f'LISTEN "{self.channel}"')
+                    logger.info("Listening for device events on %s", self.channel)
+                    delay = 1
+                    while True:
+                        notify = await conn.notifies.get()
+                        try:
+                            self._dispatch(notify.payload)
+                        except (ValueError, KeyError) as e:
+                            logger.error("Malformed device event: %s", str(e))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Device event listener lost its connection: %s", str(e))
+            finally:
+                self._listen_conn = None
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        self._outbox = asyncio.Queue(maxsize=self.publish_queue_size)
+        self._tasks = [loop.create_task(self._publisher()), loop.create_task(self._listener())]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._outbox = None
+
+    def stats(self):
+        return {
+            **self.counters,
+            'subscribers': sum(len(subscribers) for subscribers in self._subscribers.values()),
+            'outbox': self._outbox.qsize() if self._outbox is not None else 0,
+        }
+
+
+device_events = DeviceEvents(
+    channel=feed_settings.feed_channel,
+    max_pending=feed_settings.feed_max_pending,
+    publish_queue_size=feed_settings.feed_publish_queue_size,
+)
@@ -0,0 +1,202 @@
+import asyncio
+import logging
+import time
+
+import peewee
+from peewee import fn
+
+from app.core.config import db_settings
+from app.db.compiled_queries import array_param, query_cache
+from app.db.database import database, replica_database
+from app.models.model import Device, Location
+from app.utils.metrics import COUNT_BUCKETS, registry
+
+logger = logging.getLogger(__name__)
+
+batch_size = registry.histogram('app_db_batch_size', 'Primary keys per batched lookup',
+                                ('model',), buckets=COUNT_BUCKETS)
+batch_latency = registry.histogram('app_db_batch_duration_seconds', 'Batched lookup query time', ('model',))
+
+
+def _key_range(field):
+    # Postgres rejects, rather than fails to match, an id its column can't hold.
+    bits = 64 if field.field_type in ('BIGAUTO', 'BIGINT') else 32
+    return -2 ** (bits - 1), 2 ** (bits - 1) - 1
+
+
+def _retrieve(future):
+    # Every waiter may have been cancelled; don't warn about an unread error.
+    if not future.cancelled():
+        future.exception()
+
+
+class BatchLoader:
+    """Coalesces primary-key lookups of one model into ``WHERE id = ANY(...)`` queries.
+
+    Keys requested within ``window`` seconds (``0`` means the rest of the
+    current event-loop iteration) go out as one query of at most
+    ``max_batch`` keys, and a key that is already queued or being fetched
+    shares that request instead of issuing another. The batch runs on its own
+    pool connection, outside any transaction of the caller, and the instances
+    it returns are shared between callers, so treat them as read-only.
+    """
+
+    def __init__(self, model, window, max_batch, db=database):
+        self.model = model
+        self.db = db
+        self.window = window
+        self.max_batch = max_batch
+        self._labels = (model._meta.table_name,)
+        self._min_key, self._max_key = _key_range(model._meta.primary_key)
+        self._pending = {}
+        self._inflight = {}
+        self._timer = None
+        self._tasks = set()
+        self.counters = {
+            'loads': 0,
+            'deduped': 0,
+            'batches': 0,
+            'batched_keys': 0,
+            'batch_errors': 0,
+            'split_batches': 0,
+            'batch_seconds': 0.0,
+        }
+
+    async def load(self, key):
+        """Return the instance with primary key ``key``; raises ``DoesNotExist`` if there is none."""
+        key = self.model._meta.primary_key.db_value(key)
+        self.counters['loads'] += 1
+        if not isinstance(key, int) or not self._min_key <= key <= self._max_key:
+            # e.g. 'abc' or 99999999999 from a URL: it would fail the whole shared batch.
+            raise self.model.DoesNotExist()
+        future = self._pending.get(key) or self._inflight.get(key)
+        if future is not None:
+            self.counters['deduped'] += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            future.add_done_callback(_retrieve)
+            self._pending[key] = future
+            if len(self._pending) >= self.max_batch:
+                self._dispatch()
+            elif self._timer is None:
+                loop = asyncio.get_running_loop()
+                if self.window:
+                    self._timer = loop.call_later(self.window, self._dispatch)
+                else:
+                    self._timer = loop.call_soon(self._dispatch)
+        # A cancelled caller must not cancel the lookup for everyone else.
+        return await asyncio.shield(future)
+
+    def forget(self, *keys):
+        """Stop sharing in-flight lookups of ``keys``, e.g. after the rows changed.
+
+        Callers already waiting still get the row as it was read; new ones
+        start a fresh query.
+        """
+        for key in keys:
+            try:
+                self._inflight.pop(self.model._meta.primary_key.db_value(key), None)
+            except ValueError:
+                pass
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, {}
+        if batch:
+            self._inflight.update(batch)
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def _query(self):
+        model = self.model
+        primary_key = model._meta.primary_key
+        return model.select().where(primary_key == fn.ANY(array_param(primary_key, 'keys')))
+
+    async def _fetch(self, keys):
+        query = query_cache.compile(('load', self.model), self._query)
+        return await query_cache.execute(query, {'keys': keys}, self.db)
+
+    async def _fetch_each(self, batch):
+        rows = []
+        for key, future in batch.items():
+            try:
+                rows.extend(await self._fetch([key]))
+            except peewee.DataError as e:
+                self.counters['batch_errors'] += 1
+                logger.error("%s lookup of %r failed: %s", self.model.__name__, key, str(e))
+                future.set_exception(e)
+        return rows
+
+    async def _run(self, batch):
+        started_at = time.perf_counter()
+        try:
+            try:
+                rows = await self._fetch(list(batch))
+            except peewee.DataError:
+                if len(batch) == 1:
+                    raise
+                # A key the query rejects fails the whole array; look the
+                # keys up one at a time so it fails only its own caller.
+                self.counters['split_batches'] += 1
+                rows = await self._fetch_each(batch)
+        except asyncio.CancelledError:
+            for future in batch.values():
+                future.cancel()
+            raise
+        except Exception as e:
+            self.counters['batch_errors'] += 1
+            logger.error("Batched %s lookup failed: %s", self.model.__name__, str(e))
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            elapsed = time.perf_counter() - started_at
+            self.counters['batches'] += 1
+            self.counters['batched_keys'] += len(batch)
+            self.counters['batch_seconds'] += elapsed
+            batch_size.observe(len(batch), self._labels)
+            batch_latency.observe(elapsed, self._labels)
+            for key, future in batch.items():
+                if self._inflight.get(key) is future:
+                    del self._inflight[key]
+
+        found = {row._pk: row for row in rows}
+        for key, future in batch.items():
+            if future.done():
+                continue
+            if key in found:
+                future.set_result(found[key])
+            else:
+                future.set_exception(self.model.DoesNotExist())
+
+    def stats(self):
+        batches = self.counters['batches']
+        return {
+            **self.counters,
+            'avg_batch_size': self.counters['batched_keys'] / batches if batches else 0.0,
+            'pending': len(self._pending),
+            'inflight': len(self._inflight),
+        }
+
+
+device_loader = BatchLoader(Device, db_settings.db_batch_window, db_settings.db_batch_max_size)
+location_loader = BatchLoader(Location, db_settings.db_batch_window, db_settings.db_batch_max_size)
+replica_device_loader = None
+if replica_database is not None:
+    replica_device_loader = BatchLoader(Device, db_settings.db_batch_window, db_settings.db_batch_max_size,
+                                        replica_database)
+
+
+def loader_stats():
+    stats = {}
+    loaders = [('device', device_loader), ('location', location_loader)]
+    if replica_device_loader is not None:
+        loaders.append(('replica_device', replica_device_loader))
+    for name, loader in loaders:
+        for key, value in loader.stats().items():
+            stats[f'{name}_{key}'] = value
+    return stats
@@ -0,0 +1,160 @@
+import asyncio
+import contextvars
+import logging
+import time
+
+from app.core.config import db_settings
+from app.db.database import objects, pool_stats, replica_objects
+from app.utils.lru_cache import ExpiringLRUCache
+
+logger = logging.getLogger(__name__)
+
+# Set by the replica middleware while a read-only request may use the replica.
+reading_from_replica = contextvars.ContextVar('reading_from_replica', default=False)
+
+# How many recent writers to remember for read-your-writes.
+RECENT_WRITERS = 100000
+
+# Seconds the replica is behind, or NULL when a standby isn't streaming
+# from the primary: its replay position then stops moving and would
+# otherwise look caught up forever. Zero when it has replayed everything it
+# received (an idle primary sends nothing new) and on a server that isn't a
+# standby at all. The status column is NULL without pg_read_all_stats, so a
+# receiver that is running counts as streaming then.
+LAG_QUERY = """
+SELECT CASE WHEN NOT pg_is_in_recovery() THEN 0
+            WHEN NOT EXISTS (SELECT 1 FROM pg_stat_wal_receiver
+                             WHERE COALESCE(status, 'streaming') = 'streaming') THEN NULL
+            WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END
+"""
+
+
+class ReplicaRouter:
+    """Decides whether a read-only request may go to the replica.
+
+    A background task checks the replica every ``check_interval`` seconds; it
+    is used only while that check succeeds, the replica is streaming from
+    the primary and it reports at most ``max_lag`` seconds of replication
+    lag. A client that wrote within the last ``read_your_writes_window``
+    seconds reads from the primary, so it sees its own changes even if the
+    replica hasn't caught up. The time of the last write comes from the
+    client (see the replica middleware's cookie), so every worker sees it;
+    writers are also remembered by user id in the worker that served them.
+    """
+
+    def __init__(self, replica, max_lag, check_interval, read_your_writes_window):
+        self.replica = replica
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.healthy = False
+        self.lag = None
+        self.read_your_writes_window = read_your_writes_window
+        self._recent_writers = ExpiringLRUCache(RECENT_WRITERS, ttl=read_your_writes_window)
+        self._task = None
+        self.counters = {
+            'checks': 0,
+            'check_failures': 0,
+            'disconnected': 0,
+            'lagging': 0,
+            'replica_reads': 0,
+            'primary_reads': 0,
+            'read_your_writes': 0,
+        }
+
+    @property
+    def enabled(self):
+        return self.replica is not None
+
+    def note_write(self, user_id):
+        self._recent_writers.set(user_id, True)
+
+    def _wrote_recently(self, user_id, last_write):
+        # abs() allows for clock skew between hosts and keeps a forged future
+        # timestamp from pinning a client to the primary for longer.
+        if last_write is not None and abs(time.time() - last_write) < self.read_your_writes_window:
+            return True
+        return user_id is not None and self._recent_writers.get(user_id) is not None
+
+    def use_replica(self, user_id, last_write=None):
+        """Whether a read may go to the replica; ``last_write`` is the client's last write time, if known."""
+        if not self.healthy:
+            self.counters['primary_reads'] += 1
+            return False
+        if self._wrote_recently(user_id, last_write):
+            self.counters['read_your_writes'] += 1
+            self.counters['primary_reads'] += 1
+            return False
+        self.counters['replica_reads'] += 1
+        return True
+
+    async def _measure_lag(self):
+        cursor = await self.replica.database.cursor_async()
+        try:
+            await cursor.execute(LAG_QUERY)
+            lag = (await cursor.fetchone())[0]
+            return float(lag) if lag is not None else None
+        finally:
+            await cursor.release()
+
+    async def check(self):
+        self.counters['checks'] += 1
+        try:
+            self.lag = await asyncio.wait_for(self._measure_lag(), max(self.check_interval, 1.0))
+        except Exception as e:
+            self.counters['check_failures'] += 1
+            if self.healthy:
+                logger.error("Read replica check failed, reading from the primary: %s", str(e))
+            self.healthy, self.lag = False, None
+            return
+        if self.lag is None:
+            self.counters['disconnected'] += 1
+            if self.healthy:
+                logger.error("Read replica is not streaming from the primary, reading from the primary")
+            self.healthy = False
+            return
+        healthy = self.lag <= self.max_lag
+        if not healthy:
+            self.counters['lagging'] += 1
+        if healthy != self.healthy:
+            logger.warning("Read replica %s (lag %.1fs)", 'in use' if healthy else 'lagging, not used', self.lag)
+        self.healthy = healthy
+
+    async def _run(self):
+        while True:
+            await self.check()
+            await asyncio.sleep(self.check_interval)
+
+    def start(self):
+        if self.enabled:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self):
+        stats = {
+            **self.counters,
+            'healthy': int(self.healthy),
+            'lag_seconds': self.lag if self.lag is not None else -1,
+        }
+        if self.enabled:
+            for key, value in pool_stats(self.replica.database).items():
+                stats[f'pool_{key}'] = value
+        return stats
+
+
+replica_router = ReplicaRouter(
+    replica=replica_objects,
+    max_lag=db_settings.db_replica_max_lag,
+    check_interval=db_settings.db_replica_check_interval,
+    read_your_writes_window=db_settings.db_read_your_writes_window,
+)
+
+
+def reader():
+    """Manager for the reads of the current request: the replica when routed there, else the primary."""
+    return replica_objects if reading_from_replica.get() else objects
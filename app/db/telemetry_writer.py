@@ -0,0 +1,151 @@
+import asyncio
+import logging
+import time
+
+import peewee
+
+from app.core.config import telemetry_settings
+from app.db.database import objects
+from app.models.model import Telemetry
+
+logger = logging.getLogger(__name__)
+
+TELEMETRY_FIELDS = [Telemetry.device_id, Telemetry.metric, Telemetry.value, Telemetry.recorded_at]
+
+# Errors caused by the rows themselves: writing them again fails the same way.
+NON_TRANSIENT_ERRORS = (peewee.DataError, peewee.IntegrityError, ValueError, TypeError)
+
+
+class TelemetryBufferFull(Exception):
+    """Raised when accepting a batch would overflow the telemetry buffer."""
+
+
+class TelemetryWriter:
+    """In-memory buffer of telemetry rows flushed by a background task.
+
+    Handlers :meth:`add` rows and return immediately. The writer task flushes
+    whenever ``flush_rows`` rows are pending or ``flush_interval`` seconds
+    have passed, with multi-row INSERTs of ``insert_chunk`` rows each. Once
+    ``max_rows`` rows are pending, new batches are refused with
+    :class:`TelemetryBufferFull` so clients back off instead of the worker
+    running out of memory.
+
+    A chunk that fails because of its rows rather than the database is
+    written again row by row, and the rows that still fail are dropped
+    (counted as ``invalid``), so one bad reading can't block the buffer.
+    Any other error puts the unwritten rows back for the next flush.
+    """
+
+    def __init__(self, max_rows, flush_rows, flush_interval, insert_chunk):
+        self.max_rows = max_rows
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.insert_chunk = insert_chunk
+        self._rows = []
+        self._flush_needed = None
+        self._task = None
+        self._stopping = False
+        self.counters = {
+            'accepted': 0,
+            'rejected': 0,
+            'flushes': 0,
+            'flushed_rows': 0,
+            'flush_errors': 0,
+            'dropped': 0,
+            'isolated_chunks': 0,
+            'invalid': 0,
+            'flush_seconds': 0.0,
+        }
+
+    def add(self, rows):
+        if len(self._rows) + len(rows) > self.max_rows:
+            self.counters['rejected'] += len(rows)
+            raise TelemetryBufferFull()
+        self._rows.extend(rows)
+        self.counters['accepted'] += len(rows)
+        if len(self._rows) >= self.flush_rows and self._flush_needed is not None:
+            self._flush_needed.set()
+
+    async def _insert(self, rows):
+        await objects.execute(Telemetry.insert_many(rows, fields=TELEMETRY_FIELDS).returning())
+
+    async def flush(self):
+        rows, self._rows = self._rows, []
+        if not rows:
+            return
+        started_at = time.perf_counter()
+        written = 0
+        # Rows taken care of so far: written, or dropped as invalid.
+        position = 0
+        try:
+            while position < len(rows):
+                chunk = rows[position:position + self.insert_chunk]
+                try:
+                    await self._insert(chunk)
+                except NON_TRANSIENT_ERRORS as e:
+                    self.counters['isolated_chunks'] += 1
+                    logger.warning("Telemetry chunk rejected, writing it row by row: %s", str(e))
+                    for row in chunk:
+                        try:
+                            await self._insert([row])
+                            written += 1
+                        except NON_TRANSIENT_ERRORS as e:
+                            self.counters['invalid'] += 1
+                            logger.error("Dropping invalid telemetry row %r: %s", row, str(e))
+                        position += 1
+                else:
+                    written += len(chunk)
+                    position += len(chunk)
+        except Exception as e:
+            self.counters['flush_errors'] += 1
+            unwritten = rows[position:]
+            # Put the unwritten rows back in front for the next flush, as far
+            # as the buffer has room for them.
+            room = max(self.max_rows - len(self._rows), 0)
+            self._rows[:0] = unwritten[:room]
+            self.counters['dropped'] += len(unwritten) - min(room, len(unwritten))
+            logger.error("Telemetry flush failed: %s", str(e))
+        finally:
+            self.counters['flushes'] += 1
+            self.counters['flushed_rows'] += written
+            self.counters['flush_seconds'] += time.perf_counter() - started_at
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._flush_needed.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_needed.clear()
+            await self.flush()
+
+    def start(self):
+        self._stopping = False
+        self._flush_needed = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the writer task and drain whatever is still buffered."""
+        if self._task is not None:
+            # Let an in-flight flush finish rather than cancelling it halfway
+            # through, which would lose the rows it had taken off the buffer.
+            self._stopping = True
+            self._flush_needed.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    def stats(self):
+        return {
+            **self.counters,
+            'buffered': len(self._rows),
+            'max_rows': self.max_rows,
+        }
+
+
+telemetry_writer = TelemetryWriter(
+    max_rows=telemetry_settings.telemetry_buffer_size,
+    flush_rows=telemetry_settings.telemetry_flush_rows,
+    flush_interval=telemetry_settings.telemetry_flush_interval,
+    insert_chunk=telemetry_settings.telemetry_insert_chunk,
+)
@@ -1,25 +1,64 @@
-import logging
 from aiohttp import web
+from app.core.config import admission_settings, compression_settings
+from app.db.routing import replica_router
+from app.middlewares.admission_middleware import admission_middleware
+from app.middlewares.compression_middleware import compression_middleware
 from app.middlewares.jwt_middleware import jwt_middleware
+from app.middlewares.metrics_middleware import metrics_middleware
+from app.middlewares.replica_middleware import replica_middleware
 from app.routers.iot_devices import setup_iot_routes
 from app.routers.auth_router import setup_auth_routes
-from app.db.database import database, objects
+from app.routers.locations import setup_location_routes
+from app.routers.telemetry import setup_telemetry_routes
+from app.routers.device_feed import setup_device_feed_routes
+from app.routers.metrics import setup_metrics_routes
+from app.db.database import database, objects, replica_objects
+from app.auth.security import hashing_service
+from app.core.logging_config import setup_logging
 
-logging.basicConfig(level=logging.DEBUG,
-                    format='%(asctime)s %(levelname)s %(message)s',
-                    handlers=[logging.StreamHandler()])
+setup_logging()
 
 
 async def close_database(app):
     await objects.close()
+    if replica_objects is not None:
+        await replica_objects.close()
     if not database.is_closed():
         database.close()
 
 
-app = web.Application(middlewares=[jwt_middleware])
+async def start_replica_checks(app):
+    replica_router.start()
+
+
+async def stop_replica_checks(app):
+    await replica_router.stop()
+
+
+async def close_hashing_service(app):
+    hashing_service.close()
+
+
+middlewares = [metrics_middleware]
+if compression_settings.compression_enabled:
+    middlewares.append(compression_middleware)
+middlewares.append(jwt_middleware)
+if admission_settings.admission_enabled:
+    middlewares.append(admission_middleware)
+if replica_router.enabled:
+    middlewares.append(replica_middleware)
+
+app = web.Application(middlewares=middlewares)
 setup_iot_routes(app)
 setup_auth_routes(app)
+setup_location_routes(app)
+setup_telemetry_routes(app)
+setup_device_feed_routes(app)
+setup_metrics_routes(app)
+app.on_startup.append(start_replica_checks)
+app.on_cleanup.append(stop_replica_checks)
 app.on_cleanup.append(close_database)
+app.on_cleanup.append(close_hashing_service)
 
 if __name__ == '__main__':
-    web.run_app(app, host='0.0.0.0', port=8000)
+    web.run_app(app, host='0.0.0.0', port=8000, access_log=None)
@@ -0,0 +1,77 @@
+import math
+
+from aiohttp import web
+
+from app.core.config import admission_settings
+from app.utils.admission import AdmissionRejected, ConcurrencyLimiter, TokenBuckets
+
+# Long-lived or operational routes that must never queue behind API traffic.
+EXEMPT_ROUTES = {'/metrics', '/devices/feed'}
+AUTH_ROUTES = {'/login', '/register'}
+
+limiters = {
+    'auth': ConcurrencyLimiter(admission_settings.admission_auth_limit,
+                               admission_settings.admission_queue_size,
+                               admission_settings.admission_queue_timeout),
+    'read': ConcurrencyLimiter(admission_settings.admission_read_limit,
+                               admission_settings.admission_queue_size,
+                               admission_settings.admission_queue_timeout),
+    'write': ConcurrencyLimiter(admission_settings.admission_write_limit,
+                                admission_settings.admission_queue_size,
+                                admission_settings.admission_queue_timeout),
+}
+
+user_buckets = TokenBuckets(admission_settings.rate_limit_rate,
+                            admission_settings.rate_limit_burst,
+                            admission_settings.rate_limit_users)
+
+RETRY_AFTER = str(max(math.ceil(admission_settings.admission_queue_timeout), 1))
+
+
+def route_class(request):
+    resource = request.match_info.route.resource
+    if resource is None or resource.canonical in EXEMPT_ROUTES:
+        return None
+    if resource.canonical in AUTH_ROUTES:
+        return 'auth'
+    return 'read' if request.method in ('GET', 'HEAD') else 'write'
+
+
+def admission_stats():
+    stats = {}
+    for name, limiter in limiters.items():
+        for key, value in limiter.stats().items():
+            stats[f'{name}_{key}'] = value
+    for key, value in user_buckets.stats().items():
+        stats[f'rate_limit_{key}'] = value
+    return stats
+
+
+@web.middleware
+async def admission_middleware(request, handler):
+    """Admission control: per-user rate limits, then per-class concurrency limits.
+
+    Runs after jwt_middleware so authenticated requests can be rate limited
+    by their ``user_id``.
+    """
+    name = route_class(request)
+    if name is None:
+        return await handler(request)
+
+    user = request.get('user')
+    if admission_settings.rate_limit_enabled and user:
+        wait = user_buckets.take(user['user_id'])
+        if wait:
+            return web.json_response({'error': 'Rate limit exceeded'}, status=429,
+                                     headers={'Retry-After': str(math.ceil(wait))})
+
+    limiter = limiters[name]
+    try:
+        await limiter.acquire()
+    except AdmissionRejected:
+        return web.json_response({'error': 'Server is busy, try again later'}, status=503,
+                                 headers={'Retry-After': RETRY_AFTER})
+    try:
+        return await handler(request)
+    finally:
+        limiter.release()
@@ -0,0 +1,77 @@
+import asyncio
+
+from aiohttp import hdrs, web
+
+from app.core.config import compression_settings
+from app.utils.compression import ENCODERS, STREAM_CODINGS, negotiate_encoding
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'text/')
+
+
+def _compressible(response):
+    return (hdrs.CONTENT_ENCODING not in response.headers
+            and response.content_type.startswith(COMPRESSIBLE_TYPES))
+
+
+def _add_vary(response):
+    vary = response.headers.get(hdrs.VARY)
+    if not vary:
+        response.headers[hdrs.VARY] = hdrs.ACCEPT_ENCODING
+    elif hdrs.ACCEPT_ENCODING.lower() not in vary.lower():
+        response.headers[hdrs.VARY] = f'{vary}, {hdrs.ACCEPT_ENCODING}'
+
+
+def _weaken_etag(response):
+    # The compressed bytes differ from the identity ones, so a strong
+    # validator no longer describes them.
+    etag = response.headers.get(hdrs.ETAG)
+    if etag and not etag.startswith('W/'):
+        response.headers[hdrs.ETAG] = f'W/{etag}'
+
+
+async def prepare_stream(request, response):
+    """Prepare a StreamResponse, compressing it if the client accepts it.
+
+    Handlers that stream call this instead of ``response.prepare(request)``.
+    Streams always use gzip or deflate, which aiohttp can apply chunk by
+    chunk (moving large chunks to its executor).
+    """
+    if compression_settings.compression_enabled and _compressible(response):
+        _add_vary(response)
+        coding = negotiate_encoding(request.headers.get(hdrs.ACCEPT_ENCODING), STREAM_CODINGS)
+        if coding is not None:
+            response.enable_compression(web.ContentCoding(coding))
+            _weaken_etag(response)
+    return await response.prepare(request)
+
+
+@web.middleware
+async def compression_middleware(request, handler):
+    """Compress complete responses of at least ``COMPRESSION_MIN_SIZE`` bytes.
+
+    Smaller responses, like a single device, go out untouched so they pay
+    no extra latency. Bodies of ``COMPRESSION_EXECUTOR_SIZE`` bytes or more
+    are compressed in the default executor to keep the loop responsive.
+    """
+    response = await handler(request)
+    if response.prepared or not isinstance(response, web.Response):
+        return response
+    body = response.body
+    if not isinstance(body, (bytes, bytearray)) or len(body) < compression_settings.compression_min_size:
+        return response
+    if not _compressible(response):
+        return response
+
+    _add_vary(response)
+    coding = negotiate_encoding(request.headers.get(hdrs.ACCEPT_ENCODING))
+    if coding is None:
+        return response
+    encoder = ENCODERS[coding]
+    if len(body) >= compression_settings.compression_executor_size:
+        body = await asyncio.get_running_loop().run_in_executor(None, encoder, body)
+    else:
+        body = encoder(body)
+    response.body = body
+    response.headers[hdrs.CONTENT_ENCODING] = coding
+    _weaken_etag(response)
+    return response
@@ -1,15 +1,26 @@
 import jwt
 from aiohttp import web
 from app.auth.jwt_token import decode_jwt_token
+from app.auth.revocation import revocation_list
+from app.auth.token_cache import token_cache
 
 
 @web.middleware
 async def jwt_middleware(request, handler):
     auth_header = request.headers.get('Authorization', None)
+    if not auth_header and request.headers.get('Upgrade', '').lower() == 'websocket' and 'token' in request.query:
+        # Browsers can't set headers on a WebSocket handshake, so the feed
+        # also accepts the bearer token as a query parameter.
+        auth_header = f"Bearer {request.query['token']}"
     if auth_header:
         try:
             token = auth_header.split(" ")[1]
-            payload = decode_jwt_token(token)
+            payload = token_cache.get(token)
+            if payload is None:
+                payload = decode_jwt_token(token)
+                token_cache.put(token, payload)
+            if revocation_list.is_revoked(payload.get('fam')):
+                raise web.HTTPUnauthorized(reason="Token has been revoked")
             request['user'] = payload
         except (IndexError, jwt.ExpiredSignatureError, jwt.InvalidTokenError) as e:
             raise web.HTTPUnauthorized(reason=str(e))
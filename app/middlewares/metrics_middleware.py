@@ -0,0 +1,46 @@
+import time
+
+from aiohttp import web
+
+from app.db.database import request_queries
+from app.utils.metrics import registry, COUNT_BUCKETS
+
+requests_total = registry.counter('app_http_requests_total', 'HTTP requests handled',
+                                  ('method', 'route', 'status'))
+request_latency = registry.histogram('app_http_request_duration_seconds', 'HTTP request handling time',
+                                     ('method', 'route'))
+request_query_count = registry.histogram('app_http_request_db_queries', 'Database queries per HTTP request',
+                                         ('method', 'route'), buckets=COUNT_BUCKETS)
+request_query_time = registry.histogram('app_http_request_db_seconds', 'Database time per HTTP request',
+                                        ('method', 'route'))
+
+STATUS_CLASSES = {code: f'{code // 100}xx' for code in range(100, 600)}
+
+
+def _route_label(request):
+    resource = request.match_info.route.resource
+    # Unmatched paths share one label so scanners can't grow the series set.
+    return resource.canonical if resource is not None else 'unmatched'
+
+
+@web.middleware
+async def metrics_middleware(request, handler):
+    queries = [0, 0.0]
+    token = request_queries.set(queries)
+    started_at = time.perf_counter()
+    status = 500
+    try:
+        response = await handler(request)
+        status = response.status
+        return response
+    except web.HTTPException as e:
+        status = e.status
+        raise
+    finally:
+        elapsed = time.perf_counter() - started_at
+        request_queries.reset(token)
+        labels = (request.method, _route_label(request))
+        requests_total.inc(labels + (STATUS_CLASSES.get(status, 'other'),))
+        request_latency.observe(elapsed, labels)
+        request_query_count.observe(queries[0], labels)
+        request_query_time.observe(queries[1], labels)
@@ -0,0 +1,48 @@
+import math
+import time
+
+from aiohttp import web
+
+from app.db.routing import reading_from_replica, replica_router
+
+SAFE_METHODS = ('GET', 'HEAD')
+
+# Time of the client's last successful write, so that whichever worker
+# serves its next read knows to use the primary.
+LAST_WRITE_COOKIE = 'last_write'
+
+
+def _last_write(request):
+    try:
+        return float(request.cookies[LAST_WRITE_COOKIE])
+    except (KeyError, ValueError):
+        return None
+
+
+@web.middleware
+async def replica_middleware(request, handler):
+    """Let GET/HEAD requests read from the replica and remember who wrote.
+
+    Runs after jwt_middleware, so read-your-writes can also go by
+    ``user_id``. Only code that reads through ``routing.reader()`` is
+    affected; every other query still goes to the primary.
+    """
+    user = request.get('user')
+    user_id = user['user_id'] if user else None
+    if request.method in SAFE_METHODS:
+        if not replica_router.use_replica(user_id, _last_write(request)):
+            return await handler(request)
+        token = reading_from_replica.set(True)
+        try:
+            return await handler(request)
+        finally:
+            reading_from_replica.reset(token)
+    try:
+        response = await handler(request)
+    finally:
+        if user_id is not None:
+            replica_router.note_write(user_id)
+    if replica_router.enabled and response.status < 400 and not response.prepared:
+        response.set_cookie(LAST_WRITE_COOKIE, f'{time.time():.3f}', httponly=True, samesite='Strict',
+                            max_age=math.ceil(replica_router.read_your_writes_window))
+    return response
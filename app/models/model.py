@@ -1,4 +1,5 @@
-from peewee import Model, CharField, ForeignKeyField, AutoField
+from peewee import (Model, CharField, ForeignKeyField, AutoField, BigAutoField, IntegerField, FloatField,
+                    DateTimeField, CompositeKey, UUIDField, SQL)
 from app.db.database import database
 
 
@@ -28,3 +29,53 @@ class Device(BaseModel):
     location_id = ForeignKeyField(Location, null=True, backref='devices', on_delete='CASCADE',
                                   column_name='location_id')
     api_user_id = ForeignKeyField(ApiUser, backref='devices', on_delete='CASCADE', column_name='api_user_id')
+    # Bumped by every UPDATE; exposed as the ETag of the device.
+    version = IntegerField(default=1)
+
+    class Meta:
+        indexes = (
+            (('api_user_id', 'id'), False),
+        )
+
+
+class LocationDeviceCount(BaseModel):
+    # Maintained by triggers on the device table (see migration 005), so it
+    # is never written from the app. Rows can reach zero and linger until
+    # their location is deleted.
+    location_id = IntegerField()
+    type = CharField()
+    device_count = IntegerField(default=0)
+
+    class Meta:
+        table_name = 'location_device_count'
+        primary_key = CompositeKey('location_id', 'type')
+
+
+class RevokedToken(BaseModel):
+    # token_id is the jti of a refresh token that has been used, or the id
+    # of a whole token family (every token issued from one login) that has
+    # been revoked. Rows are only needed until expires_at.
+    id = BigAutoField()
+    token_id = UUIDField(unique=True)
+    expires_at = DateTimeField(index=True)
+    # Database time, so workers can sync incrementally whatever their clocks say.
+    revoked_at = DateTimeField(index=True, constraints=[SQL('DEFAULT now()')])
+
+    class Meta:
+        table_name = 'revoked_token'
+
+
+class Telemetry(BaseModel):
+    # device_id is deliberately not a foreign key: readings are buffered in
+    # memory before they are written, and a device deleted in the meantime
+    # must not make the whole batch insert fail.
+    id = BigAutoField()
+    device_id = IntegerField()
+    metric = CharField()
+    value = FloatField()
+    recorded_at = DateTimeField()
+
+    class Meta:
+        indexes = (
+            (('device_id', 'recorded_at'), False),
+        )
@@ -1,12 +1,17 @@
 import logging
+import time
 from aiohttp import web
 from pydantic import ValidationError
-from app.auth.jwt_token import create_jwt_token
-from app.auth.security import generate_password_hash, check_password_hash
+from app.auth.jwt_token import create_token_pair, decode_jwt_token
+from app.auth.revocation import revocation_list
+from app.auth.security import hashing_service, HashingQueueFull
 from app.models.model import ApiUser
+from app.db.database import objects
 from peewee import IntegrityError
-from app.schemas.user import UserRegisterModel, UserLoginModel
+from app.core.config import auth_settings
+from app.schemas.user import UserRegisterModel, UserLoginModel, TokenRefreshModel
 from app.utils.decorators import logging_decorator
+from app.utils.serialization import json_response
 
 logger = logging.getLogger(__name__)
 @logging_decorator
@@ -14,31 +19,35 @@ async def register(request):
     try:
         data = await request.json()
         validated_data = UserRegisterModel(**data)
-        hashed_password = generate_password_hash(validated_data.password)
-        user = ApiUser.create(
+        hashed_password = await hashing_service.hash(validated_data.password)
+        user = await objects.create(
+            ApiUser,
             name=validated_data.name,
             email=validated_data.email,
             password=hashed_password
         )
-        token = create_jwt_token(user.id)
+        tokens = create_token_pair(user.id)
         logger.info("User registered: %s", validated_data.email)
-        return web.json_response({'token': token}, status=200)
+        return json_response(tokens, status=200)
     except ValidationError as e:
         logger.error("Validation error: %s", e.errors())
         return web.json_response({'error': e.errors()}, status=400)
     except IntegrityError:
         logger.error("Email already exists: %s", data['email'])
         return web.json_response({'error': 'Email already exists'}, status=400)
+    except HashingQueueFull:
+        logger.warning("Hashing queue is full, rejecting registration")
+        return web.json_response({'error': 'Server is busy, try again later'}, status=503)
 @logging_decorator
 async def login(request):
     try:
         data = await request.json()
         validated_data = UserLoginModel(**data)
-        user = ApiUser.get(ApiUser.email == validated_data.email)
-        if check_password_hash(validated_data.password, user.password):
-            token = create_jwt_token(user.id)
+        user = await objects.get(ApiUser, email=validated_data.email)
+        if await hashing_service.verify(validated_data.password, user.password):
+            tokens = create_token_pair(user.id)
             logger.info("User logged in: %s", validated_data.email)
-            return web.json_response({'token': token}, status=200)
+            return json_response(tokens, status=200)
         else:
             logger.warning("Invalid credentials for: %s", validated_data.email)
             return web.json_response({'error': 'Invalid credentials'}, status=400)
@@ -48,7 +57,62 @@ async def login(request):
     except ApiUser.DoesNotExist:
         logger.error("User not found: %s", data['email'])
         return web.json_response({'error': 'User not found'}, status=400)
+    except HashingQueueFull:
+        logger.warning("Hashing queue is full, rejecting login")
+        return web.json_response({'error': 'Server is busy, try again later'}, status=503)
+
+async def _refresh_payload(request):
+    data = await request.json()
+    validated_data = TokenRefreshModel(**data)
+    return decode_jwt_token(validated_data.refresh_token, token_type='refresh')
+
+@logging_decorator
+async def refresh_token(request):
+    """Exchange a refresh token for a new access and refresh token pair.
+
+    Each refresh token works once. Presenting one again means it leaked
+    or was replayed, so its whole family is revoked and the session has to
+    log in again.
+    """
+    try:
+        payload = await _refresh_payload(request)
+        if revocation_list.is_revoked(payload['fam']):
+            return web.json_response({'error': 'Token has been revoked'}, status=401)
+        if not await revocation_list.consume(payload['jti'], payload['exp']):
+            await revocation_list.revoke(payload['fam'], time.time() + auth_settings.refresh_token_ttl)
+            logger.warning("Refresh token reused, revoked its family for user %s", payload['user_id'])
+            return web.json_response({'error': 'Token has been revoked'}, status=401)
+        return json_response(create_token_pair(payload['user_id'], payload['fam']), status=200)
+    except ValidationError as e:
+        logger.error("Validation error: %s", e.errors())
+        return web.json_response({'error': e.errors()}, status=400)
+    except web.HTTPUnauthorized as e:
+        return web.json_response({'error': e.reason}, status=401)
+
+@logging_decorator
+async def revoke_token(request):
+    """Log out: revoke the refresh token's family, access tokens included."""
+    try:
+        payload = await _refresh_payload(request)
+        await revocation_list.revoke(payload['fam'], time.time() + auth_settings.refresh_token_ttl)
+        logger.info("Revoked tokens for user %s", payload['user_id'])
+        return web.json_response({'status': 'success'})
+    except ValidationError as e:
+        logger.error("Validation error: %s", e.errors())
+        return web.json_response({'error': e.errors()}, status=400)
+    except web.HTTPUnauthorized as e:
+        return web.json_response({'error': e.reason}, status=401)
+
+async def start_revocation_sync(app):
+    revocation_list.start()
+
+async def stop_revocation_sync(app):
+    await revocation_list.stop()
 
 def setup_auth_routes(app):
     app.router.add_post('/login', login)
     app.router.add_post('/register', register)
+    app.router.add_post('/token/refresh', refresh_token)
+    app.router.add_post('/token/revoke', revoke_token)
+    app.on_startup.append(start_revocation_sync)
+    app.on_cleanup.append(stop_revocation_sync)
@@ -0,0 +1,58 @@
+import asyncio
+import logging
+import weakref
+from aiohttp import web, WSCloseCode, WSMsgType
+from app.db.device_events import device_events
+from app.utils.decorators import logging_decorator, check_authorization
+
+logger = logging.getLogger(__name__)
+
+feed_sockets_key = web.AppKey('device_feed_sockets', weakref.WeakSet)
+
+async def _send_events(ws, subscriber):
+    while not ws.closed:
+        events = await subscriber.next_events()
+        if subscriber.dropped:
+            logger.warning("Dropping slow device feed client of user %s", subscriber.user_id)
+            await ws.close(code=WSCloseCode.TRY_AGAIN_LATER, message=b'Client too slow')
+            return
+        for event in events:
+            await ws.send_json(event)
+
+@logging_decorator
+@check_authorization
+async def device_feed(request):
+    """Push the caller's device create/update/delete events over a WebSocket."""
+    user = request['user']
+    ws = web.WebSocketResponse(heartbeat=30)
+    await ws.prepare(request)
+    subscriber = device_events.subscribe(user['user_id'])
+    request.app[feed_sockets_key].add(ws)
+    sender = asyncio.create_task(_send_events(ws, subscriber))
+    try:
+        # Clients have nothing to say; reading only services pings and close frames.
+        async for msg in ws:
+            if msg.type == WSMsgType.ERROR:
+                logger.error("Device feed connection error: %s", ws.exception())
+    finally:
+        sender.cancel()
+        device_events.unsubscribe(subscriber)
+        request.app[feed_sockets_key].discard(ws)
+    return ws
+
+async def start_device_events(app):
+    device_events.start()
+
+async def close_device_feed_sockets(app):
+    for ws in set(app[feed_sockets_key]):
+        await ws.close(code=WSCloseCode.GOING_AWAY, message=b'Server shutdown')
+
+async def stop_device_events(app):
+    await device_events.stop()
+
+def setup_device_feed_routes(app):
+    app[feed_sockets_key] = weakref.WeakSet()
+    app.router.add_get('/devices/feed', device_feed)
+    app.on_startup.append(start_device_events)
+    app.on_shutdown.append(close_device_feed_sockets)
+    app.on_cleanup.append(stop_device_events)
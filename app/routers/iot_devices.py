@@ -1,15 +1,89 @@
 import logging
 from aiohttp import web
-from peewee import IntegrityError
-from playhouse.shortcuts import model_to_dict
+from peewee import IntegrityError, ValuesList, fn
 from pydantic import ValidationError
 from app.models.model import Device, Location
-from app.schemas.device import DeviceCreate, DeviceUpdate
+from app.schemas.device import DeviceCreate, DeviceUpdate, DeviceFilterQuery, DeviceListQuery, DeviceBulkOperation, DeviceBulkRequest
+from app.core.config import db_settings
+from app.db import compiled_queries
+from app.db.compiled_queries import array_param, param, query_cache
 from app.db.database import objects
+from app.db.device_cache import device_cache, cached_device
+from app.db.device_events import device_events
+from app.db.loaders import location_loader
+from app.db.routing import reader
+from app.middlewares.compression_middleware import prepare_stream
 from app.utils.decorators import logging_decorator, check_authorization
+from app.utils.serialization import dumps, json_response, model_serializer, LazyText
 
 logger = logging.getLogger(__name__)
 
+device_to_dict = model_serializer(Device)
+
+def _owned_device():
+    # Bound from the 'id' and 'api_user_id' values of a compiled query.
+    return (Device.id == param(Device.id)) & (Device.api_user_id == param(Device.api_user_id))
+
+def _update_device_query(columns, if_match):
+    """UPDATE ... RETURNING for one set of updated columns, with or without If-Match.
+
+    With ``if_match`` the row must also have one of the versions bound as
+    ``versions``, a single array whatever the header lists, so every
+    If-Match shares one compiled statement. With no columns the row is only
+    read back.
+    """
+    condition = _owned_device()
+    if if_match:
+        condition &= Device.version == fn.ANY(array_param(Device.version, 'versions'))
+    if not columns:
+        return Device.select().where(condition)
+    assignments = {getattr(Device, column): param(getattr(Device, column)) for column in columns}
+    assignments[Device.version] = Device.version + 1
+    return Device.update(assignments).where(condition).returning(*Device._meta.sorted_fields)
+
+def _delete_device_query():
+    return Device.delete().where(_owned_device()).returning(Device.id)
+
+async def _unowned_device_response(device_id, reason, user=None, versions=None):
+    """Response for an ownership-filtered write that matched no row.
+
+    Only this failure path pays for a second query, to keep "not found" (404,
+    raised as Device.DoesNotExist) apart from "someone else's device" (403)
+    and, when ``versions`` came from an ``If-Match`` header, from a stale
+    version (412).
+    """
+    device = await objects.get(Device.select(Device.api_user_id, Device.version).where(Device.id == device_id))
+    if versions is not None and str(device.api_user_id_id) == str(user['user_id']):
+        return web.json_response({'error': 'Device has been modified'}, status=412,
+                                 headers={'ETag': _etag(device.version)})
+    return web.json_response({'error': reason}, status=403)
+
+# Device.version is a 32-bit integer column.
+MAX_VERSION = 2 ** 31 - 1
+
+def _etag(version):
+    return f'"{version}"'
+
+def _parse_etags(header):
+    """Versions named by an If-Match/If-None-Match header; ``None`` means ``*``.
+
+    Weak tags (``W/"1"``) are accepted; a device body only changes with its
+    version, so weak and strong comparison agree. Tags that can't be a
+    version (not a number, or beyond the column's range) match nothing.
+    """
+    versions = set()
+    for tag in header.split(','):
+        tag = tag.strip()
+        if tag == '*':
+            return None
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        if len(tag) > 2 and tag[0] == tag[-1] == '"' and tag[1:-1].isascii() and tag[1:-1].isdigit():
+            version = int(tag[1:-1])
+            if version <= MAX_VERSION:
+                versions.add(version)
+    return versions
+
 @logging_decorator
 @check_authorization
 async def create_device(request):
@@ -18,13 +92,16 @@ async def create_device(request):
         data = await request.json()
         device_data = DeviceCreate(**data)
         if device_data.location_id:
-            location = await objects.get(Location, id=device_data.location_id)
+            location = await location_loader.load(device_data.location_id)
             if not location:
                 return web.json_response({'error': 'Location does not exist'}, status=400)
 
-        device = await objects.create(Device, **device_data.dict(), api_user_id=user['user_id'])
-        logger.debug("Created device: %s", device_data.dict())
-        return web.json_response(model_to_dict(device), status=201)
+        device = await compiled_queries.create(Device, **device_data.dict(), api_user_id=user['user_id'])
+        data = device_to_dict(device)
+        device_events.publish(user['user_id'], [{'event': 'created', 'device': data}])
+        body = dumps(data)
+        logger.debug("Created device: %s", LazyText(body))
+        return json_response(body=body, status=201, headers={'ETag': _etag(device.version)})
     except ValidationError as e:
         logger.error("Validation error: %s", e.errors())
         return web.json_response({'error': e.errors()}, status=400)
@@ -44,15 +121,96 @@ async def read_device(request):
     device_id = request.match_info['id']
     user = request['user']
     try:
-        device = await objects.get(Device, id=device_id)
-        if str(device.api_user_id) != str(user['user_id']):
+        owner_id, version, body = await cached_device(device_id)
+        if str(owner_id) != str(user['user_id']):
             return web.json_response({'error': 'Not authorized to access this device'}, status=403)
-        logger.debug("Read device: %s", model_to_dict(device))
-        return web.json_response(model_to_dict(device))
+        etag = _etag(version)
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match is not None:
+            versions = _parse_etags(if_none_match)
+            if versions is None or version in versions:
+                return web.Response(status=304, headers={'ETag': etag})
+        logger.debug("Read device: %s", LazyText(body))
+        return json_response(body=body, headers={'ETag': etag})
     except Device.DoesNotExist:
         logger.error("Device not found: %s", device_id)
         return web.json_response({'error': 'Device not found'}, status=404)
 
+def _user_devices_query(user, params):
+    query = Device.select().where(Device.api_user_id == user['user_id'])
+    if params.type is not None:
+        query = query.where(Device.type == params.type)
+    if params.location_id is not None:
+        query = query.where(Device.location_id == params.location_id)
+    return query.order_by(Device.id)
+
+@logging_decorator
+@check_authorization
+async def list_devices(request):
+    user = request['user']
+    try:
+        params = DeviceListQuery(**request.query)
+    except ValidationError as e:
+        logger.error("Validation error: %s", e.errors())
+        return web.json_response({'error': e.errors()}, status=400)
+
+    # Keyset pagination on (api_user_id, id): the composite index makes every
+    # page an index range scan, however deep the cursor is.
+    query = _user_devices_query(user, params)
+    if params.cursor is not None:
+        query = query.where(Device.id > params.cursor)
+    devices = list(await reader().execute(query.limit(params.limit + 1)))
+
+    next_cursor = None
+    if len(devices) > params.limit:
+        devices = devices[:params.limit]
+        next_cursor = devices[-1].id
+    logger.debug("Listed %d devices", len(devices))
+    return json_response({
+        'devices': [device_to_dict(device) for device in devices],
+        'next_cursor': next_cursor,
+    })
+
+@logging_decorator
+@check_authorization
+async def export_devices(request):
+    """Stream all of the caller's devices as NDJSON.
+
+    Rows come from a server-side cursor in fixed-size FETCH batches and each
+    batch is written out before the next one is read, so memory stays flat
+    however many devices there are.
+    """
+    user = request['user']
+    try:
+        params = DeviceFilterQuery(**request.query)
+    except ValidationError as e:
+        logger.error("Validation error: %s", e.errors())
+        return web.json_response({'error': e.errors()}, status=400)
+
+    sql, sql_params = _user_devices_query(user, params).sql()
+    response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson'})
+    await prepare_stream(request, response)
+    exported = 0
+    # DECLARE needs a transaction; it also pins the cursor to one connection.
+    manager = reader()
+    async with manager.atomic():
+        cursor = await manager.database.cursor_async()
+        try:
+            await cursor.execute(f'DECLARE device_export NO SCROLL CURSOR FOR {sql}', sql_params)
+            while True:
+                await cursor.execute('FETCH %s FROM device_export', (db_settings.db_export_fetch_size,))
+                rows = await cursor.fetchall()
+                if not rows:
+                    break
+                columns = [column.name for column in cursor.description]
+                await response.write(b''.join(dumps(dict(zip(columns, row))) + b'\n' for row in rows))
+                exported += len(rows)
+        finally:
+            await cursor.release()
+    await response.write_eof()
+    logger.debug("Exported %d devices", exported)
+    return response
+
 @logging_decorator
 @check_authorization
 async def update_device(request):
@@ -62,17 +220,36 @@ async def update_device(request):
         data = await request.json()
         device_data = DeviceUpdate(**data)
         if device_data.location_id:
-            location = await objects.get(Location, id=device_data.location_id)
+            location = await location_loader.load(device_data.location_id)
             if not location:
                 return web.json_response({'error': 'Location does not exist'}, status=400)
 
-        device = await objects.get(Device, id=device_id)
-        if str(device.api_user_id) != str(user['user_id']):
-            return web.json_response({'error': 'Not authorized to update this device'}, status=403)
-        await objects.execute(Device.update(**device_data.dict(exclude_unset=True)).where(Device.id == device_id))
-        device = await objects.get(Device, id=device_id)
-        logger.debug("Updated device: %s", model_to_dict(device))
-        return web.json_response(model_to_dict(device))
+        # Ownership and the If-Match version are part of the WHERE clause and
+        # the new row comes back via RETURNING, so a successful update is a
+        # single statement.
+        fields = device_data.dict(exclude_unset=True)
+        values = {**fields, 'id': device_id, 'api_user_id': user['user_id']}
+        versions = None
+        if 'If-Match' in request.headers:
+            versions = _parse_etags(request.headers['If-Match'])
+        if versions is not None:
+            values['versions'] = sorted(versions)
+        columns = tuple(sorted(fields))
+        if_match = versions is not None
+        query = query_cache.compile(('update_device', columns, if_match),
+                                    lambda: _update_device_query(columns, if_match))
+        devices = await query_cache.execute(query, values)
+        if not devices:
+            return await _unowned_device_response(device_id, 'Not authorized to update this device',
+                                                  user, versions)
+        device = devices[0]
+        device_cache.invalidate(device.id)
+        data = device_to_dict(device)
+        if fields:
+            device_events.publish(user['user_id'], [{'event': 'updated', 'device': data}])
+        body = dumps(data)
+        logger.debug("Updated device: %s", LazyText(body))
+        return json_response(body=body, headers={'ETag': _etag(device.version)})
     except ValidationError as e:
         logger.error("Validation error: %s", e.errors())
         return web.json_response({'error': e.errors()}, status=400)
@@ -95,18 +272,179 @@ async def delete_device(request):
     device_id = request.match_info['id']
     user = request['user']
     try:
-        device = await objects.get(Device, id=device_id)
-        if str(device.api_user_id) != str(user['user_id']):
-            return web.json_response({'error': 'Not authorized to delete this device'}, status=403)
-        await objects.delete(device)
+        query = query_cache.compile(('delete_device',), _delete_device_query)
+        if not await query_cache.execute(query, {'id': device_id, 'api_user_id': user['user_id']}):
+            return await _unowned_device_response(device_id, 'Not authorized to delete this device')
+        device_cache.invalidate(device_id)
+        device_events.publish(user['user_id'], [{'event': 'deleted', 'id': int(device_id)}])
         logger.debug("Deleted device: %s", device_id)
         return web.json_response({'status': 'success'})
     except Device.DoesNotExist:
         logger.error("Device not found: %s", device_id)
         return web.json_response({'error': 'Device not found'}, status=404)
 
+def _bulk_result(index, status, **extra):
+    return {'index': index, 'status': status, **extra}
+
+def _bulk_event(result):
+    if result['status'] == 201:
+        return {'event': 'created', 'device': result['device']}
+    if 'device' in result:
+        return {'event': 'updated', 'device': result['device']}
+    return {'event': 'deleted', 'id': result['id']}
+
+def _parse_bulk_operations(operations):
+    """Validate every bulk item on its own so one bad item doesn't sink the batch.
+
+    Returns the per-item results (pre-filled for invalid items) and the valid
+    creates, updates and deletes, each tagged with its index in the request.
+    """
+    results = [None] * len(operations)
+    creates, updates, deletes = [], [], []
+    seen_ids = set()
+    for index, raw in enumerate(operations):
+        try:
+            operation = DeviceBulkOperation(**raw)
+            if operation.op == 'create':
+                fields = DeviceCreate(**operation.data).dict()
+            elif operation.op == 'update':
+                fields = DeviceUpdate(**operation.data).dict(exclude_unset=True)
+            else:
+                fields = {}
+        except ValidationError as e:
+            results[index] = _bulk_result(index, 400, error=e.errors())
+            continue
+
+        if operation.op != 'create':
+            if operation.id is None:
+                results[index] = _bulk_result(index, 400, error='Device id is required')
+                continue
+            if operation.id in seen_ids:
+                results[index] = _bulk_result(index, 400, error='Device id appears more than once in the batch')
+                continue
+            seen_ids.add(operation.id)
+        if operation.op == 'update' and not fields:
+            results[index] = _bulk_result(index, 400, error='No fields to update')
+            continue
+        if fields.get('location_id'):
+            try:
+                fields['location_id'] = int(fields['location_id'])
+            except ValueError:
+                results[index] = _bulk_result(index, 400, error='Location does not exist')
+                continue
+
+        if operation.op == 'create':
+            creates.append((index, fields))
+        elif operation.op == 'update':
+            updates.append((index, operation.id, fields))
+        else:
+            deletes.append((index, operation.id))
+    return results, creates, updates, deletes
+
+async def _bulk_check_locations(results, creates, updates):
+    location_ids = {fields['location_id'] for _, fields in creates if fields.get('location_id')}
+    location_ids |= {fields['location_id'] for _, _, fields in updates if fields.get('location_id')}
+    if not location_ids:
+        return creates, updates
+    query = Location.select(Location.id).where(Location.id.in_(location_ids))
+    existing = {location.id for location in await objects.execute(query)}
+
+    def location_exists(index, fields):
+        if fields.get('location_id') and fields['location_id'] not in existing:
+            results[index] = _bulk_result(index, 400, error='Location does not exist')
+            return False
+        return True
+
+    creates = [(index, fields) for index, fields in creates if location_exists(index, fields)]
+    updates = [(index, device_id, fields) for index, device_id, fields in updates
+               if location_exists(index, fields)]
+    return creates, updates
+
+async def _bulk_create(results, creates, user_id):
+    rows = [{**fields, 'api_user_id': user_id} for _, fields in creates]
+    query = Device.insert_many(rows).returning(*Device._meta.sorted_fields)
+    # A multi-row INSERT ... VALUES returns its rows in input order.
+    for (index, _), device in zip(creates, await objects.execute(query)):
+        results[index] = _bulk_result(index, 201, device=device_to_dict(device))
+
+async def _bulk_update(results, updates, user_id):
+    # One UPDATE ... FROM (VALUES ...) per distinct set of updated columns.
+    groups = {}
+    for item in updates:
+        groups.setdefault(tuple(sorted(item[2])), []).append(item)
+    for columns, items in groups.items():
+        values = ValuesList(
+            [(device_id, *(fields[column] for column in columns)) for _, device_id, fields in items],
+            columns=('id', *columns), alias='v')
+        assignments = {}
+        for column in columns:
+            value = getattr(values.c, column)
+            if column == 'location_id':
+                value = value.cast('integer')
+            assignments[getattr(Device, column)] = value
+        assignments[Device.version] = Device.version + 1
+        query = (Device.update(assignments)
+                 .from_(values)
+                 .where(Device.id == values.c.id, Device.api_user_id == user_id)
+                 .returning(*Device._meta.sorted_fields))
+        updated = {device.id: device for device in await objects.execute(query)}
+        for index, device_id, _ in items:
+            if device_id in updated:
+                results[index] = _bulk_result(index, 200, device=device_to_dict(updated[device_id]))
+            else:
+                results[index] = _bulk_result(index, 404, error='Device not found')
+
+async def _bulk_delete(results, deletes, user_id):
+    query = (Device.delete()
+             .where(Device.id.in_([device_id for _, device_id in deletes]), Device.api_user_id == user_id)
+             .returning(Device.id))
+    deleted = {device.id for device in await objects.execute(query)}
+    for index, device_id in deletes:
+        if device_id in deleted:
+            results[index] = _bulk_result(index, 200, id=device_id)
+        else:
+            results[index] = _bulk_result(index, 404, error='Device not found')
+
+@logging_decorator
+@check_authorization
+async def bulk_devices(request):
+    user = request['user']
+    try:
+        data = await request.json()
+        bulk_request = DeviceBulkRequest(**data)
+        results, creates, updates, deletes = _parse_bulk_operations(bulk_request.operations)
+        async with objects.atomic():
+            creates, updates = await _bulk_check_locations(results, creates, updates)
+            if creates:
+                await _bulk_create(results, creates, user['user_id'])
+            if updates:
+                await _bulk_update(results, updates, user['user_id'])
+            if deletes:
+                await _bulk_delete(results, deletes, user['user_id'])
+        # Only evict once the transaction has committed, so a concurrent read
+        # can't re-cache the pre-update rows.
+        device_cache.invalidate(*(device_id for _, device_id, _ in updates),
+                                *(device_id for _, device_id in deletes))
+        device_events.publish(user['user_id'], [_bulk_event(result) for result in results
+                                                 if result['status'] in (200, 201)])
+        logger.debug("Bulk device operations: %d created, %d updated, %d deleted",
+                     len(creates), len(updates), len(deletes))
+        return json_response({'results': results})
+    except ValidationError as e:
+        logger.error("Validation error: %s", e.errors())
+        return web.json_response({'error': e.errors()}, status=400)
+    except IntegrityError as e:
+        logger.error("Integrity error: %s", str(e))
+        return web.json_response({'error': f'Integrity error: {str(e)}'}, status=400)
+    except Exception as e:
+        logger.error("Unexpected error: %s", str(e))
+        return web.json_response({'error': str(e)}, status=500)
+
 def setup_iot_routes(app):
     app.router.add_post('/device', create_device)
     app.router.add_get('/device/{id}', read_device)
+    app.router.add_get('/devices', list_devices)
+    app.router.add_get('/devices/export', export_devices)
+    app.router.add_post('/devices/bulk', bulk_devices)
     app.router.add_put('/device/{id}', update_device)
     app.router.add_delete('/device/{id}', delete_device)
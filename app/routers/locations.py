@@ -0,0 +1,179 @@
+import logging
+from aiohttp import web
+from peewee import JOIN
+from pydantic import ValidationError
+from app.models.model import Device, Location, LocationDeviceCount
+from app.schemas.location import LocationCreate, LocationUpdate, LocationListQuery
+from app.db.database import objects
+from app.db.device_cache import device_cache
+from app.db.device_events import device_events
+from app.utils.decorators import logging_decorator, check_authorization
+from app.utils.serialization import json_response, model_serializer
+
+logger = logging.getLogger(__name__)
+
+location_to_dict = model_serializer(Location)
+
+@logging_decorator
+@check_authorization
+async def create_location(request):
+    try:
+        data = await request.json()
+        location_data = LocationCreate(**data)
+        location = await objects.create(Location, **location_data.dict())
+        return json_response(location_to_dict(location), status=201)
+    except ValidationError as e:
+        logger.error("Validation error: %s", e.errors())
+        return web.json_response({'error': e.errors()}, status=400)
+    except Exception as e:
+        logger.error("Unexpected error: %s", str(e))
+        return web.json_response({'error': str(e)}, status=500)
+
+@logging_decorator
+@check_authorization
+async def read_location(request):
+    location_id = request.match_info['id']
+    try:
+        location = await objects.get(Location, id=location_id)
+        return json_response(location_to_dict(location))
+    except Location.DoesNotExist:
+        logger.error("Location not found: %s", location_id)
+        return web.json_response({'error': 'Location not found'}, status=404)
+
+@logging_decorator
+@check_authorization
+async def list_locations(request):
+    try:
+        params = LocationListQuery(**request.query)
+    except ValidationError as e:
+        logger.error("Validation error: %s", e.errors())
+        return web.json_response({'error': e.errors()}, status=400)
+
+    query = Location.select().order_by(Location.id)
+    if params.cursor is not None:
+        query = query.where(Location.id > params.cursor)
+    locations = list(await objects.execute(query.limit(params.limit + 1)))
+
+    next_cursor = None
+    if len(locations) > params.limit:
+        locations = locations[:params.limit]
+        next_cursor = locations[-1].id
+    return json_response({
+        'locations': [location_to_dict(location) for location in locations],
+        'next_cursor': next_cursor,
+    })
+
+@logging_decorator
+@check_authorization
+async def update_location(request):
+    location_id = request.match_info['id']
+    try:
+        data = await request.json()
+        fields = LocationUpdate(**data).dict(exclude_unset=True)
+        if fields:
+            query = (Location.update(**fields)
+                     .where(Location.id == location_id)
+                     .returning(*Location._meta.sorted_fields))
+        else:
+            query = Location.select().where(Location.id == location_id)
+        locations = list(await objects.execute(query))
+        if not locations:
+            raise Location.DoesNotExist()
+        return json_response(location_to_dict(locations[0]))
+    except ValidationError as e:
+        logger.error("Validation error: %s", e.errors())
+        return web.json_response({'error': e.errors()}, status=400)
+    except Location.DoesNotExist:
+        logger.error("Location not found: %s", location_id)
+        return web.json_response({'error': 'Location not found'}, status=404)
+    except Exception as e:
+        logger.error("Unexpected error: %s", str(e))
+        return web.json_response({'error': str(e)}, status=500)
+
+@logging_decorator
+@check_authorization
+async def delete_location(request):
+    """Delete a location together with the caller's devices at it.
+
+    Deleting a location cascades to its devices, so it is refused while
+    other users still have devices there. The caller's devices are deleted
+    explicitly first to learn their ids for cache eviction and feed events.
+    """
+    location_id = request.match_info['id']
+    user = request['user']
+    try:
+        async with objects.atomic():
+            # Locking the row makes concurrent device inserts at this location
+            # wait for us, and then fail their foreign key check.
+            query = Location.select(Location.id).where(Location.id == location_id).for_update()
+            if not list(await objects.execute(query)):
+                raise Location.DoesNotExist()
+            foreign = Device.select(Device.id).where(
+                (Device.location_id == location_id) & (Device.api_user_id != user['user_id'])).limit(1)
+            if list(await objects.execute(foreign)):
+                return web.json_response({'error': 'Location has devices of other users'}, status=409)
+            deleted = list(await objects.execute(
+                Device.delete().where(Device.location_id == location_id).returning(Device.id)))
+            await objects.execute(Location.delete().where(Location.id == location_id))
+            await objects.execute(
+                LocationDeviceCount.delete().where(LocationDeviceCount.location_id == location_id))
+    except Location.DoesNotExist:
+        logger.error("Location not found: %s", location_id)
+        return web.json_response({'error': 'Location not found'}, status=404)
+    except Exception as e:
+        logger.error("Unexpected error: %s", str(e))
+        return web.json_response({'error': str(e)}, status=500)
+
+    device_ids = [device.id for device in deleted]
+    if device_ids:
+        device_cache.invalidate(*device_ids)
+        device_events.publish(user['user_id'], [{'event': 'deleted', 'id': device_id} for device_id in device_ids])
+    logger.debug("Deleted location %s with %d devices", location_id, len(device_ids))
+    return web.json_response({'status': 'success', 'deleted_devices': len(device_ids)})
+
+def _counts_by_type(rows):
+    counts = {row.type: row.device_count for row in rows}
+    return {'counts': counts, 'total': sum(counts.values())}
+
+@logging_decorator
+@check_authorization
+async def location_device_counts(request):
+    location_id = request.match_info['id']
+    try:
+        location = await objects.get(Location, id=location_id)
+    except Location.DoesNotExist:
+        logger.error("Location not found: %s", location_id)
+        return web.json_response({'error': 'Location not found'}, status=404)
+    rows = await objects.execute(LocationDeviceCount.select().where(
+        (LocationDeviceCount.location_id == location.id) & (LocationDeviceCount.device_count > 0)))
+    return json_response({'location_id': location.id, **_counts_by_type(rows)})
+
+@logging_decorator
+@check_authorization
+async def all_location_device_counts(request):
+    """Device counts by type for every location, read from the summary table.
+
+    Cost grows with the number of locations and types, not devices.
+    """
+    query = (Location
+             .select(Location.id, Location.name, LocationDeviceCount.type, LocationDeviceCount.device_count)
+             .join(LocationDeviceCount, JOIN.LEFT_OUTER,
+                   on=((LocationDeviceCount.location_id == Location.id) & (LocationDeviceCount.device_count > 0)))
+             .order_by(Location.id)
+             .tuples())
+    summary = {}
+    for location_id, name, device_type, device_count in await objects.execute(query):
+        entry = summary.setdefault(location_id, {'location_id': location_id, 'name': name, 'counts': {}, 'total': 0})
+        if device_type is not None:
+            entry['counts'][device_type] = device_count
+            entry['total'] += device_count
+    return json_response({'locations': list(summary.values())})
+
+def setup_location_routes(app):
+    app.router.add_post('/location', create_location)
+    app.router.add_get('/locations', list_locations)
+    app.router.add_get('/locations/device-counts', all_location_device_counts)
+    app.router.add_get('/location/{id}', read_location)
+    app.router.add_put('/location/{id}', update_location)
+    app.router.add_delete('/location/{id}', delete_location)
+    app.router.add_get('/location/{id}/device-counts', location_device_counts)
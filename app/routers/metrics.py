@@ -0,0 +1,40 @@
+from aiohttp import web
+from app.auth.revocation import revocation_list
+from app.auth.security import hashing_service
+from app.auth.token_cache import token_cache
+from app.core.logging_config import log_stats
+from app.db.compiled_queries import query_cache
+from app.db.database import pool_stats
+from app.db.device_cache import device_cache
+from app.db.device_events import device_events
+from app.db.loaders import loader_stats
+from app.db.routing import replica_router
+from app.db.telemetry_writer import telemetry_writer
+from app.middlewares.admission_middleware import admission_stats
+from app.utils.metrics import registry
+
+STATS_SOURCES = (
+    ('app_db_pool', 'Database connection pool', pool_stats),
+    ('app_db_replica', 'Read replica routing', replica_router.stats),
+    ('app_compiled_queries', 'Compiled query cache', query_cache.stats),
+    ('app_device_cache', 'Device response cache', device_cache.stats),
+    ('app_loader', 'Batched primary-key lookups', loader_stats),
+    ('app_token_cache', 'Decoded JWT cache', token_cache.stats),
+    ('app_token_revocation', 'Revoked refresh tokens and families', revocation_list.stats),
+    ('app_hashing', 'Password hashing pool', hashing_service.stats),
+    ('app_telemetry', 'Telemetry write buffer', telemetry_writer.stats),
+    ('app_device_events', 'Device change feed', device_events.stats),
+    ('app_logging', 'Log queue', log_stats),
+    ('app_admission', 'Admission control', admission_stats),
+)
+
+for prefix, documentation, stats_func in STATS_SOURCES:
+    registry.add_stats_source(prefix, documentation, stats_func)
+
+
+async def metrics(request):
+    return web.Response(text=registry.render(), content_type='text/plain', charset='utf-8')
+
+
+def setup_metrics_routes(app):
+    app.router.add_get('/metrics', metrics)
@@ -0,0 +1,96 @@
+import json
+import logging
+from datetime import datetime, timezone
+from aiohttp import web
+from pydantic import ValidationError
+from app.core.config import telemetry_settings
+from app.db.device_cache import cached_device
+from app.db.telemetry_writer import telemetry_writer, TelemetryBufferFull
+from app.models.model import Device
+from app.schemas.device import TelemetryReading
+from app.utils.decorators import logging_decorator, check_authorization
+
+logger = logging.getLogger(__name__)
+
+async def _check_device_owner(device_id, user):
+    try:
+        owner_id, _, _ = await cached_device(device_id)
+    except Device.DoesNotExist:
+        logger.error("Device not found: %s", device_id)
+        return web.json_response({'error': 'Device not found'}, status=404)
+    if str(owner_id) != str(user['user_id']):
+        return web.json_response({'error': 'Not authorized to report for this device'}, status=403)
+    return None
+
+def _accept_readings(device_id, readings):
+    received_at = datetime.utcnow()
+    rows = []
+    for reading in readings:
+        recorded_at = reading.recorded_at or received_at
+        if recorded_at.tzinfo is not None:
+            recorded_at = recorded_at.astimezone(timezone.utc).replace(tzinfo=None)
+        rows.append((int(device_id), reading.metric, reading.value, recorded_at))
+    try:
+        telemetry_writer.add(rows)
+    except TelemetryBufferFull:
+        logger.warning("Telemetry buffer is full, rejecting %d readings", len(rows))
+        return web.json_response({'error': 'Telemetry buffer is full, try again later'}, status=503,
+                                 headers={'Retry-After': '1'})
+    return web.json_response({'accepted': len(rows)}, status=202)
+
+@logging_decorator
+@check_authorization
+async def post_telemetry(request):
+    device_id = request.match_info['id']
+    error_response = await _check_device_owner(device_id, request['user'])
+    if error_response is not None:
+        return error_response
+    try:
+        data = await request.json()
+        items = data if isinstance(data, list) else [data]
+        if len(items) > telemetry_settings.telemetry_max_batch:
+            return web.json_response({'error': 'Too many readings in one request'}, status=413)
+        readings = [TelemetryReading(**item) for item in items]
+    except ValidationError as e:
+        logger.error("Validation error: %s", e.errors())
+        return web.json_response({'error': e.errors()}, status=400)
+    except (ValueError, TypeError):
+        return web.json_response({'error': 'Body must be a reading object or a list of them'}, status=400)
+    return _accept_readings(device_id, readings)
+
+@logging_decorator
+@check_authorization
+async def post_telemetry_batch(request):
+    """Accept newline-delimited JSON readings, one object per line."""
+    device_id = request.match_info['id']
+    error_response = await _check_device_owner(device_id, request['user'])
+    if error_response is not None:
+        return error_response
+    readings = []
+    line_number = 0
+    async for line in request.content:
+        line_number += 1
+        line = line.strip()
+        if not line:
+            continue
+        if len(readings) >= telemetry_settings.telemetry_max_batch:
+            return web.json_response({'error': 'Too many readings in one request'}, status=413)
+        try:
+            readings.append(TelemetryReading(**json.loads(line)))
+        except ValidationError as e:
+            return web.json_response({'error': e.errors(), 'line': line_number}, status=400)
+        except (ValueError, TypeError):
+            return web.json_response({'error': 'Invalid JSON object', 'line': line_number}, status=400)
+    return _accept_readings(device_id, readings)
+
+async def start_telemetry_writer(app):
+    telemetry_writer.start()
+
+async def stop_telemetry_writer(app):
+    await telemetry_writer.stop()
+
+def setup_telemetry_routes(app):
+    app.router.add_post('/device/{id}/telemetry', post_telemetry)
+    app.router.add_post('/device/{id}/telemetry/batch', post_telemetry_batch)
+    app.on_startup.append(start_telemetry_writer)
+    app.on_cleanup.append(stop_telemetry_writer)
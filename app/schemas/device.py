@@ -1,5 +1,6 @@
+from datetime import datetime
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Literal, Optional
 
 
 class DeviceCreate(BaseModel):
@@ -15,3 +16,25 @@ class DeviceUpdate(BaseModel):
     login: Optional[str] = None
     password: Optional[str] = None
     location_id: Optional[str] = None
+
+class DeviceFilterQuery(BaseModel):
+    type: Optional[str] = None
+    location_id: Optional[int] = None
+
+class DeviceListQuery(DeviceFilterQuery):
+    cursor: Optional[int] = None
+    limit: int = Field(50, ge=1, le=500)
+
+class DeviceBulkOperation(BaseModel):
+    op: Literal['create', 'update', 'delete']
+    id: Optional[int] = None
+    data: dict = {}
+
+class DeviceBulkRequest(BaseModel):
+    operations: List[dict] = Field(..., min_length=1, max_length=10000)
+
+class TelemetryReading(BaseModel):
+    # No NUL or other control characters: Postgres can't store NUL in text.
+    metric: str = Field(..., min_length=1, max_length=255, pattern=r'^[^\x00-\x1f\x7f]+$')
+    value: float
+    recorded_at: Optional[datetime] = None
@@ -0,0 +1,13 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+
+
+class LocationCreate(BaseModel):
+    name: str
+
+class LocationUpdate(BaseModel):
+    name: Optional[str] = None
+
+class LocationListQuery(BaseModel):
+    cursor: Optional[int] = None
+    limit: int = Field(50, ge=1, le=500)
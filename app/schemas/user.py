@@ -8,3 +8,6 @@ class UserRegisterModel(BaseModel):
 class UserLoginModel(BaseModel):
     email: EmailStr
     password: constr(min_length=6)
+
+class TokenRefreshModel(BaseModel):
+    refresh_token: str
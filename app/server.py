@@ -0,0 +1,172 @@
+"""Pre-fork entry point: ``python -m app.server --workers 4``.
+
+A supervisor process starts ``--workers`` copies of the app that share one
+listening port, restarts any that die, and on SIGTERM or SIGINT asks every
+worker to drain and waits for them to exit.
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import time
+from multiprocessing.connection import wait
+
+from app.core.config import server_settings
+from app.core.logging_config import setup_logging
+
+logger = logging.getLogger(__name__)
+
+# A worker that dies sooner than this after starting is treated as a crash
+# loop, and its restarts are spaced out with a growing backoff.
+MIN_HEALTHY_UPTIME = 5.0
+MAX_RESTART_BACKOFF = 30.0
+
+
+def _run_worker(host, port, sock, shutdown_timeout):
+    # Leave the terminal's process group so a Ctrl-C reaches only the
+    # supervisor, which then stops each worker exactly once.
+    os.setpgrp()
+
+    # Imported here so every worker builds its own DB pool, caches, logging
+    # thread and background tasks instead of inheriting the supervisor's.
+    from aiohttp import web
+    from app.main import app
+
+    # Access lines come from app.access, sampled; aiohttp's own would log every request.
+    if sock is not None:
+        web.run_app(app, sock=sock, shutdown_timeout=shutdown_timeout, print=None, access_log=None)
+    else:
+        web.run_app(app, host=host, port=port, reuse_port=True,
+                    shutdown_timeout=shutdown_timeout, print=None, access_log=None)
+
+
+class Supervisor:
+    """Keeps ``workers`` app processes running on a shared port.
+
+    With ``reuse_port`` each worker binds its own SO_REUSEPORT socket and the
+    kernel balances connections between them; otherwise the supervisor binds
+    once and the workers accept on the inherited socket.
+    """
+
+    def __init__(self, workers, host, port, reuse_port, shutdown_timeout):
+        self.workers = workers
+        self.host = host
+        self.port = port
+        self.reuse_port = reuse_port and hasattr(socket, 'SO_REUSEPORT')
+        self.shutdown_timeout = shutdown_timeout
+        self._context = multiprocessing.get_context('spawn')
+        self._sock = None
+        self._processes = {}
+        self._started_at = {}
+        self._restart_at = {}
+        self._restart_delay = {}
+        self._stopping = False
+        self.restarts = 0
+
+    def _hash_pool_workers(self):
+        if 'HASH_POOL_WORKERS' in os.environ:
+            return None
+        # Split the cores between the workers' bcrypt pools instead of
+        # giving every worker a pool as large as the machine.
+        return max((os.cpu_count() or 1) // self.workers, 1)
+
+    def _start(self, slot):
+        hash_pool_workers = self._hash_pool_workers()
+        if hash_pool_workers is not None:
+            # A spawned worker imports app.core.config while unpickling its
+            # target, before any of its own code runs, so the setting has to
+            # be in the environment it inherits.
+            os.environ['HASH_POOL_WORKERS'] = str(hash_pool_workers)
+        process = self._context.Process(
+            target=_run_worker,
+            args=(self.host, self.port, self._sock, self.shutdown_timeout),
+            name=f'app-worker-{slot}',
+        )
+        process.start()
+        self._processes[slot] = process
+        self._started_at[slot] = time.monotonic()
+        logger.info("Started worker %d (pid %d)", slot, process.pid)
+
+    def _handle_signal(self, signum, frame):
+        if not self._stopping:
+            logger.info("Received %s, draining workers", signal.Signals(signum).name)
+        self._stopping = True
+
+    def _restart_dead_workers(self):
+        now = time.monotonic()
+        for slot, process in list(self._processes.items()):
+            if process.is_alive():
+                continue
+            uptime = now - self._started_at[slot]
+            logger.error("Worker %d (pid %d) exited with code %s after %.1fs",
+                         slot, process.pid, process.exitcode, uptime)
+            del self._processes[slot]
+            process.close()
+            delay = 0.0
+            if uptime < MIN_HEALTHY_UPTIME:
+                delay = min(max(self._restart_delay.get(slot, 0.0) * 2, 1.0), MAX_RESTART_BACKOFF)
+            self._restart_delay[slot] = delay
+            self._restart_at[slot] = now + delay
+        for slot, restart_at in list(self._restart_at.items()):
+            if now >= restart_at:
+                del self._restart_at[slot]
+                self.restarts += 1
+                self._start(slot)
+
+    def _stop_workers(self):
+        for process in self._processes.values():
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGTERM)
+        deadline = time.monotonic() + self.shutdown_timeout + 5
+        for slot, process in self._processes.items():
+            process.join(max(deadline - time.monotonic(), 0))
+            if process.is_alive():
+                logger.error("Worker %d (pid %d) did not drain in time, killing it", slot, process.pid)
+                process.kill()
+                process.join()
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self._handle_signal)
+        signal.signal(signal.SIGINT, self._handle_signal)
+        if not self.reuse_port:
+            self._sock = socket.create_server((self.host, self.port), backlog=1024)
+        logger.info("Serving on %s:%d with %d workers (%s)", self.host, self.port, self.workers,
+                    'SO_REUSEPORT' if self.reuse_port else 'shared socket')
+        try:
+            for slot in range(self.workers):
+                self._start(slot)
+            while not self._stopping:
+                wait([process.sentinel for process in self._processes.values()], timeout=0.5)
+                if not self._stopping:
+                    self._restart_dead_workers()
+        finally:
+            self._stop_workers()
+            if self._sock is not None:
+                self._sock.close()
+        logger.info("All workers stopped")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the API with several worker processes.")
+    parser.add_argument('--workers', type=int, default=server_settings.web_workers,
+                        help='worker processes, 0 for one per CPU (default: WEB_WORKERS)')
+    parser.add_argument('--host', default=server_settings.server_host)
+    parser.add_argument('--port', type=int, default=server_settings.server_port)
+    parser.add_argument('--no-reuse-port', dest='reuse_port', action='store_false',
+                        default=server_settings.reuse_port,
+                        help='share one inherited socket instead of SO_REUSEPORT')
+    parser.add_argument('--shutdown-timeout', type=float, default=server_settings.shutdown_timeout,
+                        help='seconds each worker may spend draining requests')
+    args = parser.parse_args(argv)
+
+    setup_logging()
+    workers = args.workers or os.cpu_count() or 1
+    Supervisor(workers, args.host, args.port, args.reuse_port, args.shutdown_timeout).run()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
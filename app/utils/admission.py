@@ -0,0 +1,119 @@
+import asyncio
+import time
+from collections import deque
+
+from app.utils.lru_cache import ExpiringLRUCache
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request can't be admitted before its queue deadline."""
+
+
+class ConcurrencyLimiter:
+    """Caps concurrent requests, with a bounded FIFO queue for the overflow.
+
+    At most ``limit`` holders run at once. Up to ``queue_size`` more wait
+    for a slot, each for at most ``timeout`` seconds. Anything beyond that
+    is rejected straight away with :class:`AdmissionRejected`, so under
+    overload the excess is turned away quickly instead of piling up behind
+    a slow database.
+    """
+
+    def __init__(self, limit, queue_size, timeout):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.active = 0
+        self._waiters = deque()
+        self.counters = {
+            'admitted': 0,
+            'queued': 0,
+            'rejected_queue_full': 0,
+            'rejected_timeout': 0,
+            'queue_wait_seconds': 0.0,
+        }
+
+    async def acquire(self):
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            self.counters['admitted'] += 1
+            return
+        if len(self._waiters) >= self.queue_size:
+            self.counters['rejected_queue_full'] += 1
+            raise AdmissionRejected()
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.counters['queued'] += 1
+        queued_at = time.perf_counter()
+        try:
+            await asyncio.wait((waiter,), timeout=self.timeout)
+        except asyncio.CancelledError:
+            self._abandon(waiter)
+            raise
+        finally:
+            self.counters['queue_wait_seconds'] += time.perf_counter() - queued_at
+        if not waiter.done():
+            self._abandon(waiter)
+            self.counters['rejected_timeout'] += 1
+            raise AdmissionRejected()
+        self.counters['admitted'] += 1
+
+    def _abandon(self, waiter):
+        if waiter.done() and not waiter.cancelled():
+            # The slot was handed over just as we gave up; pass it on.
+            self.release()
+        else:
+            waiter.cancel()
+            self._waiters.remove(waiter)
+
+    def release(self):
+        # A freed slot goes straight to the oldest waiter, so active stays
+        # the same and newcomers can't jump the queue.
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self):
+        return {
+            **self.counters,
+            'active': self.active,
+            'waiting': len(self._waiters),
+            'limit': self.limit,
+        }
+
+
+class TokenBuckets:
+    """Per-key token buckets refilled at ``rate`` tokens/s up to ``burst``.
+
+    Buckets live in an LRU of ``max_keys`` entries. An idle bucket expires
+    once it would have refilled anyway, so dropping it loses nothing.
+    """
+
+    def __init__(self, rate, burst, max_keys):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = ExpiringLRUCache(max_keys, ttl=burst / rate)
+        self.counters = {'allowed': 0, 'limited': 0}
+
+    def take(self, key):
+        """Take one token; return 0 if allowed, else seconds until one is available."""
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            tokens = self.burst
+        else:
+            tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        if tokens < 1:
+            self._buckets.set(key, (tokens, now))
+            self.counters['limited'] += 1
+            return (1 - tokens) / self.rate
+        self._buckets.set(key, (tokens - 1, now))
+        self.counters['allowed'] += 1
+        return 0
+
+    def stats(self):
+        return {**self.counters, 'keys': len(self._buckets)}
@@ -0,0 +1,81 @@
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    from compression import zstd
+except ImportError:
+    try:
+        from backports import zstd
+    except ImportError:
+        zstd = None
+
+if zstd is None:
+    try:
+        import zstandard
+    except ImportError:
+        zstandard = None
+
+
+def _gzip(data):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _deflate(data):
+    return zlib.compress(data, 6)
+
+
+ENCODERS = {}
+if zstd is not None:
+    ENCODERS['zstd'] = lambda data: zstd.compress(data, 3)
+elif zstandard is not None:
+    ENCODERS['zstd'] = zstandard.ZstdCompressor(level=3).compress
+if brotli is not None:
+    ENCODERS['br'] = lambda data: brotli.compress(data, quality=5)
+ENCODERS['gzip'] = _gzip
+ENCODERS['deflate'] = _deflate
+
+# Codings aiohttp can apply incrementally to a StreamResponse.
+STREAM_CODINGS = ('gzip', 'deflate')
+
+
+def parse_accept_encoding(header):
+    """Map each coding in an ``Accept-Encoding`` header to its q-value."""
+    accepted = {}
+    for item in header.split(','):
+        coding, _, params = item.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding] = quality
+    return accepted
+
+
+def negotiate_encoding(header, supported=tuple(ENCODERS)):
+    """Pick the coding to use for a response, or ``None`` to send it as is.
+
+    The client's q-values decide; among equally preferred codings the
+    earlier one in ``supported`` wins, which puts the better compressors
+    first.
+    """
+    if not header:
+        return None
+    accepted = parse_accept_encoding(header)
+    best, best_quality = None, 0.0
+    for coding in supported:
+        quality = accepted.get(coding, accepted.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
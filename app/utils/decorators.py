@@ -1,21 +1,43 @@
 import logging
+import random
+import time
 from functools import wraps
 from aiohttp import web
 
+from app.core.config import logging_settings
+
 logger = logging.getLogger(__name__)
+access_logger = logging.getLogger('app.access')
+
+ACCESS_LOG_SAMPLE_RATE = logging_settings.access_log_sample_rate
+
 
 def logging_decorator(func):
+    name = func.__name__
+
     @wraps(func)
     async def wrapper(*args, **kwargs):
         request = args[0]
-        logger.info(f"Entering {func.__name__} with {request.method} request to {request.path}")
+        logger.debug("Entering %s with %s request to %s", name, request.method, request.path)
+        started_at = time.perf_counter()
         try:
             response = await func(*args, **kwargs)
-            logger.info(f"Exiting {func.__name__} with status {response.status}")
-            return response
         except Exception as e:
-            logger.error(f"Error in {func.__name__}: {str(e)}")
+            logger.error("Error in %s: %s", name, str(e))
             raise
+        # Access lines are sampled and only built when they will be emitted.
+        if access_logger.isEnabledFor(logging.INFO) and (
+                ACCESS_LOG_SAMPLE_RATE >= 1 or random.random() < ACCESS_LOG_SAMPLE_RATE):
+            duration_ms = (time.perf_counter() - started_at) * 1000
+            access_logger.info("%s %s %s %s %.1fms", name, request.method, request.path, response.status,
+                               duration_ms, extra={'fields': {
+                                   'handler': name,
+                                   'method': request.method,
+                                   'path': request.path,
+                                   'status': response.status,
+                                   'duration_ms': round(duration_ms, 3),
+                               }})
+        return response
     return wrapper
 
 
@@ -0,0 +1,67 @@
+import time
+from collections import OrderedDict
+
+
+class ExpiringLRUCache:
+    """Size-bounded LRU mapping whose entries also expire at a point in time.
+
+    Every entry carries an absolute ``expires_at`` timestamp (``time.time()``
+    based); it defaults to now plus ``ttl`` when the cache has one. Hit, miss,
+    eviction and expiry counters are kept in ``counters``.
+    """
+
+    def __init__(self, max_size, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self.counters = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expired': 0,
+        }
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.counters['misses'] += 1
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.time():
+            del self._entries[key]
+            self.counters['expired'] += 1
+            self.counters['misses'] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.counters['hits'] += 1
+        return value
+
+    def set(self, key, value, expires_at=None):
+        if self.max_size <= 0:
+            return
+        if expires_at is None and self.ttl is not None:
+            expires_at = time.time() + self.ttl
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.counters['evictions'] += 1
+
+    def pop(self, key):
+        entry = self._entries.pop(key, None)
+        return entry[0] if entry else None
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        lookups = self.counters['hits'] + self.counters['misses']
+        return {
+            **self.counters,
+            'hit_ratio': self.counters['hits'] / lookups if lookups else 0.0,
+            'size': len(self._entries),
+            'max_size': self.max_size,
+        }
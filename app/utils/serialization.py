@@ -0,0 +1,56 @@
+import json
+
+from aiohttp import web
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(obj):
+    """Encode ``obj`` as JSON bytes, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, default=str).encode('utf-8')
+
+
+_serializers = {}
+
+
+def model_serializer(model):
+    """Return a function that turns ``model`` instances into flat dicts.
+
+    The result matches ``model_to_dict(instance, recurse=False)``, but the
+    field list is resolved once per model instead of on every call, and
+    foreign keys are always read as raw ids so no related row is fetched.
+    """
+    serializer = _serializers.get(model)
+    if serializer is None:
+        names = tuple(field.name for field in model._meta.sorted_fields)
+
+        def serializer(instance):
+            data = instance.__data__
+            return {name: data.get(name) for name in names}
+
+        _serializers[model] = serializer
+    return serializer
+
+
+def json_response(data=None, *, body=None, status=200, headers=None):
+    """Like ``web.json_response``, but takes already encoded ``body`` bytes."""
+    if body is None:
+        body = dumps(data)
+    return web.Response(body=body, status=status, headers=headers, content_type='application/json')
+
+
+class LazyText:
+    """Log argument that decodes JSON bytes only if the record is emitted."""
+
+    __slots__ = ('body',)
+
+    def __init__(self, body):
+        self.body = body
+
+    def __str__(self):
+        return self.body.decode('utf-8')
@@ -0,0 +1,236 @@
+"""Load benchmark for the HTTP API.
+
+Boots ``app.main.app`` in-process on aiohttp's test server and drives
+``--users`` concurrent clients through register, login and then
+``--iterations`` device cycles of create, ``--reads`` reads, update, read
+and delete. Reports requests per second, p50/p95/p99 latency and database
+queries per request for each operation, and compares them with a saved
+JSON baseline:
+
+    python -m benchmarks.api --save-baseline       # record benchmarks/baselines/api.json
+    python -m benchmarks.api --threshold 0.2       # exit 1 on a >20% regression
+
+Needs the same database as the app, with migrations applied. Baselines are
+only comparable on the machine and settings they were recorded with; the
+settings are stored alongside the numbers.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import uuid
+
+# Access lines for every request would dominate the measurement.
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+import aiohttp
+from aiohttp.test_utils import TestClient, TestServer
+
+from app.core.config import auth_settings, cache_settings, db_settings
+from app.main import app
+from app.middlewares.metrics_middleware import request_query_count
+from app.utils.serialization import orjson
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baselines', 'api.json')
+
+# Operation name -> (method, route) label used by the metrics middleware.
+OPERATIONS = {
+    'register': ('POST', '/register'),
+    'login': ('POST', '/login'),
+    'create': ('POST', '/device'),
+    'read': ('GET', '/device/{id}'),
+    'update': ('PUT', '/device/{id}'),
+    'delete': ('DELETE', '/device/{id}'),
+}
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {name: [] for name in OPERATIONS}
+        self.errors = {name: 0 for name in OPERATIONS}
+
+    async def call(self, name, request, expected):
+        started_at = time.perf_counter()
+        async with request as response:
+            body = await response.json()
+            status = response.status
+        self.latencies[name].append(time.perf_counter() - started_at)
+        if status != expected:
+            self.errors[name] += 1
+        return body
+
+
+async def virtual_user(client, recorder, iterations, reads, rng):
+    email = f'bench-{uuid.uuid4().hex}@example.com'
+    password = 'benchpassword'
+    await recorder.call('register', client.post('/register', json={
+        'name': 'bench', 'email': email, 'password': password}), 200)
+    body = await recorder.call('login', client.post('/login', json={'email': email, 'password': password}), 200)
+    headers = {'Authorization': f"Bearer {body['token']}"}
+
+    for i in range(iterations):
+        device = await recorder.call('create', client.post('/device', headers=headers, json={
+            'name': f'bench-{i}', 'type': rng.choice(('Sensor', 'Actuator', 'Gateway')),
+            'login': 'bench', 'password': 'bench'}), 201)
+        path = f"/device/{device['id']}"
+        for _ in range(reads):
+            await recorder.call('read', client.get(path, headers=headers), 200)
+        await recorder.call('update', client.put(path, headers=headers, json={'name': f'bench-{i}-updated'}), 200)
+        await recorder.call('read', client.get(path, headers=headers), 200)
+        await recorder.call('delete', client.delete(path, headers=headers), 200)
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def summarize(latencies, duration, queries=None):
+    ordered = sorted(latencies)
+    summary = {
+        'requests': len(ordered),
+        'rps': round(len(ordered) / duration, 1) if duration else 0.0,
+        'mean_ms': round(statistics.fmean(ordered) * 1000, 3) if ordered else 0.0,
+        'p50_ms': round(percentile(ordered, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(ordered, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(ordered, 0.99) * 1000, 3),
+    }
+    if queries is not None:
+        summary['queries_per_request'] = round(queries / len(ordered), 3) if ordered else 0.0
+    return summary
+
+
+def _query_totals():
+    return {name: (request_query_count.count(labels), request_query_count.total(labels))
+            for name, labels in OPERATIONS.items()}
+
+
+async def run(users, iterations, reads, seed, warmup):
+    rng = random.Random(seed)
+    connector = aiohttp.TCPConnector(limit=users)
+    async with TestClient(TestServer(app), connector=connector) as client:
+        if warmup:
+            await virtual_user(client, Recorder(), warmup, reads, rng)
+        recorder = Recorder()
+        queries_before = _query_totals()
+        started_at = time.perf_counter()
+        await asyncio.gather(*(virtual_user(client, recorder, iterations, reads, random.Random(rng.random()))
+                               for _ in range(users)))
+        duration = time.perf_counter() - started_at
+        queries_after = _query_totals()
+
+    operations = {}
+    for name in OPERATIONS:
+        queries = queries_after[name][1] - queries_before[name][1]
+        operations[name] = {**summarize(recorder.latencies[name], duration, queries),
+                            'errors': recorder.errors[name]}
+    all_latencies = [value for values in recorder.latencies.values() for value in values]
+    total_queries = sum(queries_after[name][1] - queries_before[name][1] for name in OPERATIONS)
+    return {
+        'settings': {
+            'users': users,
+            'iterations': iterations,
+            'reads': reads,
+            'seed': seed,
+            'python': platform.python_version(),
+            'aiohttp': aiohttp.__version__,
+            'encoder': 'orjson' if orjson is not None else 'json',
+            'bcrypt_rounds': int(auth_settings.bcrypt_rounds),
+            'db_pool_max_size': int(db_settings.db_pool_max_size),
+            'device_cache_size': int(cache_settings.device_cache_size),
+        },
+        'duration_s': round(duration, 3),
+        'total': {**summarize(all_latencies, duration, total_queries),
+                  'errors': sum(recorder.errors.values())},
+        'operations': operations,
+    }
+
+
+def compare(result, baseline, threshold, min_delta_ms=1.0):
+    """Return a list of regressions of ``result`` against ``baseline``.
+
+    Latency percentiles and queries per request may grow, and throughput may
+    drop, by at most ``threshold`` (a fraction) before they count. Latency
+    changes under ``min_delta_ms`` are ignored as noise.
+    """
+    regressions = []
+    sections = [('total', result['total'], baseline.get('total', {}))]
+    sections += [(name, stats, baseline.get('operations', {}).get(name, {}))
+                 for name, stats in result['operations'].items()]
+    for name, current, previous in sections:
+        for key in ('p50_ms', 'p95_ms', 'p99_ms', 'queries_per_request'):
+            if not previous.get(key) or current.get(key, 0) <= previous[key] * (1 + threshold):
+                continue
+            if key.endswith('_ms') and current[key] - previous[key] < min_delta_ms:
+                continue
+            regressions.append(f'{name} {key}: {previous[key]} -> {current[key]}')
+        if previous.get('rps') and name == 'total' and current['rps'] < previous['rps'] * (1 - threshold):
+            regressions.append(f"{name} rps: {previous['rps']} -> {current['rps']}")
+    return regressions
+
+
+def print_report(result):
+    print(f"{'operation':10s} {'requests':>8s} {'rps':>8s} {'p50 ms':>8s} {'p95 ms':>8s} {'p99 ms':>8s} "
+          f"{'queries':>8s} {'errors':>6s}")
+    rows = list(result['operations'].items()) + [('total', result['total'])]
+    for name, stats in rows:
+        print(f"{name:10s} {stats['requests']:8d} {stats['rps']:8.1f} {stats['p50_ms']:8.2f} "
+              f"{stats['p95_ms']:8.2f} {stats['p99_ms']:8.2f} {stats['queries_per_request']:8.2f} "
+              f"{stats['errors']:6d}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=20, help='concurrent clients')
+    parser.add_argument('--iterations', type=int, default=20, help='device cycles per client')
+    parser.add_argument('--reads', type=int, default=3, help='reads after each create')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--warmup', type=int, default=2, help='device cycles to run before measuring')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='baseline JSON file')
+    parser.add_argument('--save-baseline', action='store_true', help='write the result as the new baseline')
+    parser.add_argument('--output', help='also write the result to this JSON file')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='allowed regression as a fraction (default 0.2)')
+    parser.add_argument('--min-delta-ms', type=float, default=1.0,
+                        help='ignore latency changes smaller than this (default 1.0)')
+    args = parser.parse_args(argv)
+
+    result = asyncio.run(run(args.users, args.iterations, args.reads, args.seed, args.warmup))
+    print_report(result)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+    if result['total']['errors']:
+        print(f"{result['total']['errors']} requests returned an unexpected status")
+        return 1
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to record one")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    changed = {key: value for key, value in baseline.get('settings', {}).items()
+               if result['settings'].get(key) != value}
+    if changed:
+        print(f"Warning: baseline was recorded with different settings: {changed}")
+    regressions = compare(result, baseline, args.threshold, args.min_delta_ms)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
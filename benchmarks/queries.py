@@ -0,0 +1,131 @@
+"""Benchmark: ORM queries against compiled ones on the device hot paths.
+
+The first part needs no database: it times building the SQL and
+parameters of the get, create, update and delete queries through peewee
+on every call against looking up the compiled shape and binding values.
+With ``--db`` each path also runs ``iterations`` create/get/update/delete
+cycles against the app database (migrations applied), both with plain
+compiled SQL and with prepared statements.
+
+    python -m benchmarks.queries [--iterations N] [--db]
+"""
+import argparse
+import asyncio
+import time
+import timeit
+import uuid
+
+from app.db import compiled_queries
+from app.db.compiled_queries import QueryCache, param
+from app.db.database import database, objects
+from app.models.model import ApiUser, Device
+
+FIELDS = {'name': 'Device1', 'type': 'Sensor', 'login': 'device_login', 'password': 'device_pass',
+          'location_id': None}
+UPDATE = {'name': 'Device2', 'type': 'Actuator'}
+
+
+def _owned_device(device_id, user_id):
+    return (Device.id == device_id) & (Device.api_user_id == user_id)
+
+
+def orm_queries(device_id, user_id):
+    return (
+        Device.select().where(Device.id == device_id),
+        Device.insert(**Device(**FIELDS, api_user_id=user_id).__data__),
+        Device.update(**UPDATE, version=Device.version + 1)
+        .where(_owned_device(device_id, user_id)).returning(*Device._meta.sorted_fields),
+        Device.delete().where(_owned_device(device_id, user_id)).returning(Device.id),
+    )
+
+
+def compiled_shapes(cache):
+    owned = lambda: (Device.id == param(Device.id)) & (Device.api_user_id == param(Device.api_user_id))
+    fields = Device._meta.fields
+    columns = tuple(Device(**FIELDS, api_user_id=1).__data__)
+    return (
+        cache.compile(('get', Device, ('id',)),
+                      lambda: Device.select().where(Device.id == param(Device.id))),
+        cache.compile(('create', Device, columns),
+                      lambda: Device.insert({fields[name]: param(fields[name]) for name in columns})
+                      .returning(*Device._meta.sorted_fields)),
+        cache.compile(('update_device', tuple(sorted(UPDATE)), None),
+                      lambda: Device.update({**{fields[name]: param(fields[name]) for name in UPDATE},
+                                             Device.version: Device.version + 1})
+                      .where(owned()).returning(*Device._meta.sorted_fields)),
+        cache.compile(('delete_device',), lambda: Device.delete().where(owned()).returning(Device.id)),
+    )
+
+
+def bench_build(iterations):
+    cache = QueryCache(prepared_statements=False)
+    values = {**FIELDS, **UPDATE, 'id': 1, 'api_user_id': 1, 'version': 1}
+
+    def orm():
+        for query in orm_queries(1, 1):
+            query.sql()
+
+    def compiled():
+        for query in compiled_shapes(cache):
+            query.bind(values)
+
+    results = {}
+    for name, func in (('ORM build + sql()', orm), ('compiled lookup + bind', compiled)):
+        seconds = min(timeit.repeat(func, number=iterations, repeat=5))
+        results[name] = seconds / iterations / 4 * 1e6
+        print(f"{name:28s} {results[name]:8.2f} us/query")
+    old, new = results.values()
+    print(f"speedup: {old / new:.2f}x")
+
+
+async def orm_cycle(user_id):
+    device = await objects.create(Device, **FIELDS, api_user_id=user_id)
+    await objects.get(Device, id=device.id)
+    list(await objects.execute(orm_queries(device.id, user_id)[2]))
+    list(await objects.execute(orm_queries(device.id, user_id)[3]))
+
+
+def compiled_cycle(cache):
+    async def cycle(user_id):
+        get, _, update, delete = compiled_shapes(cache)
+        device = await compiled_queries.create(Device, **FIELDS, api_user_id=user_id)
+        owned = {'id': device.id, 'api_user_id': user_id}
+        await cache.execute(get, {'id': device.id})
+        await cache.execute(update, {**UPDATE, **owned})
+        await cache.execute(delete, owned)
+    return cycle
+
+
+async def bench_db(iterations):
+    user = await objects.create(ApiUser, name='bench', email=f'bench-{uuid.uuid4().hex}@example.com',
+                                password='x')
+    try:
+        paths = (
+            ('ORM', orm_cycle),
+            ('compiled', compiled_cycle(QueryCache(prepared_statements=False))),
+            ('compiled + prepared', compiled_cycle(QueryCache(prepared_statements=True))),
+        )
+        for name, cycle in paths:
+            await cycle(user.id)
+            started_at = time.perf_counter()
+            for _ in range(iterations):
+                await cycle(user.id)
+            elapsed = time.perf_counter() - started_at
+            print(f"{name:28s} {elapsed / iterations / 4 * 1e6:8.1f} us/query")
+    finally:
+        await objects.delete(user)
+        await database.close_async()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--iterations', type=int, default=2000)
+    parser.add_argument('--db', action='store_true', help='also run the queries against the database')
+    args = parser.parse_args()
+    bench_build(args.iterations)
+    if args.db:
+        asyncio.run(bench_db(args.iterations))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""Micro-benchmark: cost of serializing one device response.
+
+Compares the old path (``model_to_dict`` twice, once for the debug log and
+once for the response, then ``web.json_response``) with the new one
+(``model_serializer`` plus ``dumps`` once, reused for logging).
+
+    python -m benchmarks.serialization [iterations]
+"""
+import logging
+import sys
+import timeit
+
+from aiohttp import web
+from playhouse.shortcuts import model_to_dict
+
+from app.models.model import Device
+from app.utils.serialization import dumps, json_response, model_serializer, orjson, LazyText
+
+logger = logging.getLogger('benchmarks.serialization')
+logger.setLevel(logging.INFO)
+
+device = Device(id=1, name='Device1', type='Sensor', login='device_login', password='device_pass',
+                location_id=None, api_user_id=1)
+device_to_dict = model_serializer(Device)
+
+
+def old_path():
+    logger.debug("Read device: %s", model_to_dict(device, recurse=False))
+    return web.json_response(model_to_dict(device, recurse=False))
+
+
+def new_path():
+    body = dumps(device_to_dict(device))
+    logger.debug("Read device: %s", LazyText(body))
+    return json_response(body=body)
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    assert old_path().text == new_path().text or orjson is not None
+    results = {}
+    for name, func in (('model_to_dict + json_response', old_path), ('model_serializer + dumps', new_path)):
+        seconds = min(timeit.repeat(func, number=iterations, repeat=5))
+        results[name] = seconds / iterations * 1e6
+        print(f"{name:32s} {results[name]:8.2f} us/response")
+    old, new = results.values()
+    print(f"encoder: {'orjson' if orjson is not None else 'stdlib json'}, speedup: {old / new:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,27 @@
+"""Peewee migrations -- 003_device_owner_index.py.
+
+Composite index backing keyset pagination of a user's devices
+(``WHERE api_user_id = ? AND id > ? ORDER BY id``).
+
+"""
+
+from contextlib import suppress
+
+import peewee as pw
+from peewee_migrate import Migrator
+
+
+with suppress(ImportError):
+    import playhouse.postgres_ext as pw_pext
+
+
+def migrate(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Write your migrations here."""
+    
+    migrator.add_index('device', 'api_user_id', 'id', unique=False)
+
+
+def rollback(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Write your rollback migrations here."""
+    
+    migrator.drop_index('device', 'api_user_id', 'id')
@@ -0,0 +1,37 @@
+"""Peewee migrations -- 004_telemetry.py.
+
+Time-series table for device telemetry readings written by the
+background telemetry writer.
+
+"""
+
+from contextlib import suppress
+
+import peewee as pw
+from peewee_migrate import Migrator
+
+
+with suppress(ImportError):
+    import playhouse.postgres_ext as pw_pext
+
+
+def migrate(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Write your migrations here."""
+    
+    @migrator.create_model
+    class Telemetry(pw.Model):
+        id = pw.BigAutoField()
+        device_id = pw.IntegerField()
+        metric = pw.CharField(max_length=255)
+        value = pw.FloatField()
+        recorded_at = pw.DateTimeField()
+
+        class Meta:
+            table_name = "telemetry"
+            indexes = [(('device_id', 'recorded_at'), False)]
+
+
+def rollback(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Write your rollback migrations here."""
+    
+    migrator.remove_model('telemetry')
@@ -0,0 +1,105 @@
+"""Peewee migrations -- 005_location_device_counts.py.
+
+Per-location, per-type device counts kept up to date by statement-level
+triggers on the device table, so every write path (including bulk
+operations and cascading deletes) adjusts them in its own transaction.
+
+"""
+
+from contextlib import suppress
+
+import peewee as pw
+from peewee_migrate import Migrator
+
+
+with suppress(ImportError):
+    import playhouse.postgres_ext as pw_pext
+
+
+# Net change per (location_id, type) for the rows touched by one statement.
+# Each statement upserts its groups in key order, so concurrent writers take
+# the summary row locks in the same order and cannot deadlock on them.
+APPLY_FUNCTION = """
+CREATE OR REPLACE FUNCTION location_device_count_apply() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO location_device_count AS c (location_id, type, device_count)
+        SELECT location_id, type, count(*) FROM new_rows
+        WHERE location_id IS NOT NULL
+        GROUP BY location_id, type
+        ORDER BY location_id, type
+        ON CONFLICT (location_id, type) DO UPDATE SET device_count = c.device_count + EXCLUDED.device_count;
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO location_device_count AS c (location_id, type, device_count)
+        SELECT location_id, type, -count(*) FROM old_rows
+        WHERE location_id IS NOT NULL
+        GROUP BY location_id, type
+        ORDER BY location_id, type
+        ON CONFLICT (location_id, type) DO UPDATE SET device_count = c.device_count + EXCLUDED.device_count;
+    ELSE
+        INSERT INTO location_device_count AS c (location_id, type, device_count)
+        SELECT location_id, type, sum(delta) FROM (
+            SELECT location_id, type, 1 AS delta FROM new_rows
+            UNION ALL
+            SELECT location_id, type, -1 AS delta FROM old_rows
+        ) AS changes
+        WHERE location_id IS NOT NULL
+        GROUP BY location_id, type
+        HAVING sum(delta) <> 0
+        ORDER BY location_id, type
+        ON CONFLICT (location_id, type) DO UPDATE SET device_count = c.device_count + EXCLUDED.device_count;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+TRIGGERS = [
+    """CREATE TRIGGER device_location_count_insert AFTER INSERT ON device
+       REFERENCING NEW TABLE AS new_rows
+       FOR EACH STATEMENT EXECUTE FUNCTION location_device_count_apply()""",
+    """CREATE TRIGGER device_location_count_update AFTER UPDATE ON device
+       REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+       FOR EACH STATEMENT EXECUTE FUNCTION location_device_count_apply()""",
+    """CREATE TRIGGER device_location_count_delete AFTER DELETE ON device
+       REFERENCING OLD TABLE AS old_rows
+       FOR EACH STATEMENT EXECUTE FUNCTION location_device_count_apply()""",
+]
+
+BACKFILL = """
+INSERT INTO location_device_count (location_id, type, device_count)
+SELECT location_id, type, count(*) FROM device
+WHERE location_id IS NOT NULL
+GROUP BY location_id, type
+"""
+
+
+def migrate(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Write your migrations here."""
+    
+    @migrator.create_model
+    class LocationDeviceCount(pw.Model):
+        location_id = pw.IntegerField()
+        type = pw.CharField(max_length=255)
+        device_count = pw.IntegerField(default=0)
+
+        class Meta:
+            table_name = "location_device_count"
+            primary_key = pw.CompositeKey('location_id', 'type')
+
+    # The backfill and the triggers run in one transaction with the device
+    # table locked, so no write can fall between the two.
+    migrator.sql('LOCK TABLE device IN SHARE ROW EXCLUSIVE MODE')
+    migrator.sql(APPLY_FUNCTION)
+    for trigger in TRIGGERS:
+        migrator.sql(trigger)
+    migrator.sql(BACKFILL)
+
+
+def rollback(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Write your rollback migrations here."""
+    
+    for name in ('insert', 'update', 'delete'):
+        migrator.sql(f'DROP TRIGGER IF EXISTS device_location_count_{name} ON device')
+    migrator.sql('DROP FUNCTION IF EXISTS location_device_count_apply()')
+    migrator.remove_model('location_device_count')
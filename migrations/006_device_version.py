@@ -0,0 +1,27 @@
+"""Peewee migrations -- 006_device_version.py.
+
+Row version of a device, incremented by every update. It is served as the
+device's ETag and checked against ``If-Match`` inside the UPDATE itself.
+
+"""
+
+from contextlib import suppress
+
+import peewee as pw
+from peewee_migrate import Migrator
+
+
+with suppress(ImportError):
+    import playhouse.postgres_ext as pw_pext
+
+
+def migrate(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Write your migrations here."""
+    
+    migrator.add_fields('device', version=pw.IntegerField(default=1))
+
+
+def rollback(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Write your rollback migrations here."""
+    
+    migrator.remove_fields('device', 'version')
@@ -0,0 +1,35 @@
+"""Peewee migrations -- 007_revoked_tokens.py.
+
+Used refresh tokens and revoked token families. Every worker mirrors the
+unexpired rows in memory to check tokens without a query.
+
+"""
+
+from contextlib import suppress
+
+import peewee as pw
+from peewee_migrate import Migrator
+
+
+with suppress(ImportError):
+    import playhouse.postgres_ext as pw_pext
+
+
+def migrate(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Write your migrations here."""
+    
+    @migrator.create_model
+    class RevokedToken(pw.Model):
+        id = pw.BigAutoField()
+        token_id = pw.UUIDField(unique=True)
+        expires_at = pw.DateTimeField(index=True)
+        revoked_at = pw.DateTimeField(index=True, constraints=[pw.SQL('DEFAULT now()')])
+
+        class Meta:
+            table_name = "revoked_token"
+
+
+def rollback(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Write your rollback migrations here."""
+    
+    migrator.remove_model('revoked_token')
@@ -1,5 +1,24 @@
+"""Apply the schema migrations: ``python migrations/migrate.py [--full]``.
+
+Autogenerating a migration imports every package and diffs all models
+against the migration history, which dominates startup. By default the
+script hashes the models in ``app.models`` together with the migration
+files and skips that step, and the pending-migration check, when the hash
+matches the one recorded by the last successful run. ``--full`` always
+autogenerates, as every start used to.
+
+The work runs under a Postgres advisory lock, so replicas starting at once
+apply migrations one at a time; the ones that wait find the new hash
+recorded and skip straight through. The script exits non-zero when the
+migrations fail, so a chained app start doesn't run.
+"""
+import argparse
+import hashlib
 import logging
+import sys
+import time
 from peewee_migrate import Router
+from peewee_migrate.router import load_models
 from app.db.database import database
 
 logging.basicConfig(
@@ -15,13 +34,94 @@ logger = logging.getLogger(__name__)
 
 router = Router(database, migrate_dir='migrations')
 
+MODELS_MODULE = 'app.models'
+LOCK_NAME = 'migrations'
+STATE_TABLE = 'migrate_schema_state'
+
+
+def schema_hash():
+    """Hash of the model schema and the migration files on disk."""
+    digest = hashlib.sha256()
+    for model in sorted(load_models(MODELS_MODULE), key=lambda model: model._meta.table_name):
+        schema = model._schema
+        digest.update(schema._create_table(safe=False).query()[0].encode())
+        for index in schema._create_indexes(safe=False):
+            digest.update(index.query()[0].encode())
+        # Defaults are applied by peewee, so they don't appear in the DDL.
+        for field in model._meta.sorted_fields:
+            if field.default is not None and not callable(field.default):
+                digest.update(f'{field.name}={field.default!r}'.encode())
+    for name in router.todo:
+        digest.update(name.encode())
+        digest.update((router.migrate_dir / f'{name}.py').read_bytes())
+    return digest.hexdigest()
+
+
+def recorded_hash():
+    database.execute_sql(
+        f'CREATE TABLE IF NOT EXISTS {STATE_TABLE} ('
+        'id INTEGER PRIMARY KEY, schema_hash TEXT NOT NULL, '
+        'updated_at TIMESTAMPTZ NOT NULL DEFAULT now())')
+    row = database.execute_sql(f'SELECT schema_hash FROM {STATE_TABLE} WHERE id = 1').fetchone()
+    return row[0] if row else None
+
+
+def record_hash(value):
+    database.execute_sql(
+        f'INSERT INTO {STATE_TABLE} (id, schema_hash) VALUES (1, %s) '
+        'ON CONFLICT (id) DO UPDATE SET schema_hash = EXCLUDED.schema_hash, updated_at = now()',
+        (value,))
+
+
+def migrate(full=False):
+    """Bring the schema up to date; returns the seconds spent in each step."""
+    timings = {}
+    started_at = time.perf_counter()
+
+    def lap(step):
+        nonlocal started_at
+        now = time.perf_counter()
+        timings[step] = now - started_at
+        started_at = now
+
+    with database.allow_sync(), database.connection_context():
+        # The app's DB_STATEMENT_TIMEOUT would cut short both the wait for
+        # the lock and a slow migration, letting this replica start the app
+        # on an old schema.
+        database.execute_sql('SET statement_timeout = 0')
+        database.execute_sql('SELECT pg_advisory_lock(hashtext(%s))', (LOCK_NAME,))
+        lap('lock')
+        try:
+            current = schema_hash()
+            unchanged = not full and current == recorded_hash() and not router.diff
+            lap('check')
+            if unchanged:
+                logger.info("Schema unchanged, skipping migration generation.")
+                return timings
+            logger.info("Creating new migration file if there are changes in the models.")
+            router.create(auto=True)
+            lap('autogenerate')
+            logger.info("Applying all pending migrations.")
+            router.run()
+            record_hash(schema_hash())
+            lap('apply')
+        finally:
+            database.execute_sql('SELECT pg_advisory_unlock(hashtext(%s))', (LOCK_NAME,))
+    return timings
+
+
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Apply the schema migrations.')
+    parser.add_argument('--full', action='store_true',
+                        help='always autogenerate a migration from the models, even if the schema hash matches')
+    args = parser.parse_args()
     try:
         logger.info("Starting migration process.")
-        logger.info("Creating new migration file if there are changes in the models.")
-        router.create(auto=True)
-        logger.info("Applying all pending migrations.")
-        router.run()
-        logger.info("Migration process completed successfully.")
+        timings = migrate(full=args.full)
+        logger.info("Migration process completed successfully in %.3fs (%s).", sum(timings.values()),
+                    ', '.join(f'{step} {seconds:.3f}s' for step, seconds in timings.items()))
     except Exception as e:
         logger.error(f"An error occurred during the migration process: {e}")
+        # Fail the `migrate.py && python -m app.server` chain rather than
+        # start the app on an old schema.
+        sys.exit(1)
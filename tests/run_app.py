@@ -1,4 +1,4 @@
 from aiohttp import web
 from app.main import app
 if __name__ == '__main__':
-    web.run_app(app, host='0.0.0.0', port=8000)
+    web.run_app(app, host='0.0.0.0', port=8000, access_log=None)
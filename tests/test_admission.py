@@ -0,0 +1,54 @@
+import asyncio
+import unittest
+
+from app.utils.admission import AdmissionRejected, ConcurrencyLimiter, TokenBuckets
+
+
+class ConcurrencyLimiterTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_queued_request_gets_the_released_slot(self):
+        limiter = ConcurrencyLimiter(limit=1, queue_size=1, timeout=1)
+        await limiter.acquire()
+        waiter = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        self.assertEqual(limiter.stats()['waiting'], 1)
+        limiter.release()
+        await waiter
+        self.assertEqual(limiter.stats()['active'], 1)
+        limiter.release()
+        self.assertEqual(limiter.stats()['active'], 0)
+
+    async def test_rejects_when_queue_is_full(self):
+        limiter = ConcurrencyLimiter(limit=1, queue_size=1, timeout=1)
+        await limiter.acquire()
+        waiter = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        with self.assertRaises(AdmissionRejected):
+            await limiter.acquire()
+        self.assertEqual(limiter.stats()['rejected_queue_full'], 1)
+        waiter.cancel()
+
+    async def test_rejects_after_queue_deadline(self):
+        limiter = ConcurrencyLimiter(limit=1, queue_size=5, timeout=0.01)
+        await limiter.acquire()
+        with self.assertRaises(AdmissionRejected):
+            await limiter.acquire()
+        stats = limiter.stats()
+        self.assertEqual(stats['rejected_timeout'], 1)
+        self.assertEqual(stats['waiting'], 0)
+        limiter.release()
+        self.assertEqual(limiter.stats()['active'], 0)
+
+
+class TokenBucketsTestCase(unittest.TestCase):
+    def test_limits_after_burst(self):
+        buckets = TokenBuckets(rate=1, burst=2, max_keys=10)
+        self.assertEqual(buckets.take(1), 0)
+        self.assertEqual(buckets.take(1), 0)
+        self.assertGreater(buckets.take(1), 0)
+        # Other users have their own buckets.
+        self.assertEqual(buckets.take(2), 0)
+        self.assertEqual(buckets.stats()['limited'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,10 @@
+import asyncio
+import json
+import re
 import subprocess
 import time
+import uuid
+import aiohttp
 import requests
 import unittest
 
@@ -50,6 +55,50 @@ class APITestCase(unittest.TestCase):
         response_data = response.json()
         self.assertIn('token', response_data)
 
+    def test_refresh_token_rotation(self):
+        response = requests.post('http://localhost:8000/login', json={
+            "email": "testuser@example.com",
+            "password": "testpassword"
+        })
+        tokens = response.json()
+        self.assertIn('refresh_token', tokens)
+
+        response = requests.post('http://localhost:8000/token/refresh', json={'refresh_token': tokens['refresh_token']})
+        self.assertEqual(response.status_code, 200)
+        refreshed = response.json()
+        self.assertNotEqual(refreshed['refresh_token'], tokens['refresh_token'])
+        response = requests.get('http://localhost:8000/devices',
+                                headers={'Authorization': f"Bearer {refreshed['token']}"})
+        self.assertEqual(response.status_code, 200)
+
+        # A refresh token can't stand in for an access token.
+        response = requests.get('http://localhost:8000/devices',
+                                headers={'Authorization': f"Bearer {refreshed['refresh_token']}"})
+        self.assertEqual(response.status_code, 401)
+
+        # Replaying a used refresh token revokes the whole family.
+        response = requests.post('http://localhost:8000/token/refresh', json={'refresh_token': tokens['refresh_token']})
+        self.assertEqual(response.status_code, 401)
+        response = requests.post('http://localhost:8000/token/refresh', json={'refresh_token': refreshed['refresh_token']})
+        self.assertEqual(response.status_code, 401)
+        response = requests.get('http://localhost:8000/devices',
+                                headers={'Authorization': f"Bearer {refreshed['token']}"})
+        self.assertEqual(response.status_code, 401)
+
+    def test_revoke_token(self):
+        response = requests.post('http://localhost:8000/login', json={
+            "email": "testuser@example.com",
+            "password": "testpassword"
+        })
+        tokens = response.json()
+        response = requests.post('http://localhost:8000/token/revoke', json={'refresh_token': tokens['refresh_token']})
+        self.assertEqual(response.status_code, 200)
+        response = requests.post('http://localhost:8000/token/refresh', json={'refresh_token': tokens['refresh_token']})
+        self.assertEqual(response.status_code, 401)
+        response = requests.get('http://localhost:8000/devices',
+                                headers={'Authorization': f"Bearer {tokens['token']}"})
+        self.assertEqual(response.status_code, 401)
+
     def test_create_and_read_device(self):
         create_response = requests.post('http://localhost:8000/device', json={
             "name": "Device1",
@@ -159,6 +208,365 @@ class APITestCase(unittest.TestCase):
                                           headers={'Authorization': f'Bearer {different_user_token}'})
         self.assertEqual(delete_response.status_code, 403)
 
+    def test_read_after_update_and_delete_is_fresh(self):
+        create_response = requests.post('http://localhost:8000/device', json={
+            "name": "Device1",
+            "type": "Sensor",
+            "login": "device_login",
+            "password": "device_pass",
+        }, headers={'Authorization': f'Bearer {self.token}'})
+        device_id = create_response.json()['id']
+        device_url = f'http://localhost:8000/device/{device_id}'
+        headers = {'Authorization': f'Bearer {self.token}'}
+
+        self.assertEqual(requests.get(device_url, headers=headers).json()['name'], "Device1")
+        requests.put(device_url, json={"name": "Updated Device"}, headers=headers)
+        self.assertEqual(requests.get(device_url, headers=headers).json()['name'], "Updated Device")
+        requests.delete(device_url, headers=headers)
+        self.assertEqual(requests.get(device_url, headers=headers).status_code, 404)
+
+    def test_update_and_delete_missing_device(self):
+        update_response = requests.put('http://localhost:8000/device/2147483647', json={
+            "name": "Updated Device"
+        }, headers={'Authorization': f'Bearer {self.token}'})
+        self.assertEqual(update_response.status_code, 404)
+        delete_response = requests.delete('http://localhost:8000/device/2147483647',
+                                          headers={'Authorization': f'Bearer {self.token}'})
+        self.assertEqual(delete_response.status_code, 404)
+
+    def test_list_devices_paginates_with_cursor(self):
+        device_type = f"Pager-{uuid.uuid4().hex}"
+        created_ids = []
+        for i in range(3):
+            create_response = requests.post('http://localhost:8000/device', json={
+                "name": f"Device{i}",
+                "type": device_type,
+                "login": "device_login",
+                "password": "device_pass",
+            }, headers={'Authorization': f'Bearer {self.token}'})
+            self.assertEqual(create_response.status_code, 201)
+            created_ids.append(create_response.json()['id'])
+
+        first_page = requests.get('http://localhost:8000/devices', params={
+            "type": device_type, "limit": 2
+        }, headers={'Authorization': f'Bearer {self.token}'})
+        self.assertEqual(first_page.status_code, 200)
+        first_data = first_page.json()
+        self.assertEqual([d['id'] for d in first_data['devices']], created_ids[:2])
+        self.assertEqual(first_data['next_cursor'], created_ids[1])
+
+        second_page = requests.get('http://localhost:8000/devices', params={
+            "type": device_type, "limit": 2, "cursor": first_data['next_cursor']
+        }, headers={'Authorization': f'Bearer {self.token}'})
+        self.assertEqual(second_page.status_code, 200)
+        second_data = second_page.json()
+        self.assertEqual([d['id'] for d in second_data['devices']], created_ids[2:])
+        self.assertIsNone(second_data['next_cursor'])
+
+    def test_export_devices_streams_ndjson(self):
+        device_type = f"Export-{uuid.uuid4().hex}"
+        created_ids = []
+        for i in range(3):
+            create_response = requests.post('http://localhost:8000/device', json={
+                "name": f"Device{i}",
+                "type": device_type,
+                "login": "device_login",
+                "password": "device_pass",
+            }, headers={'Authorization': f'Bearer {self.token}'})
+            created_ids.append(create_response.json()['id'])
+
+        response = requests.get('http://localhost:8000/devices/export', params={"type": device_type},
+                                headers={'Authorization': f'Bearer {self.token}'}, stream=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in response.iter_lines() if line]
+        self.assertEqual([row['id'] for row in rows], created_ids)
+        self.assertEqual(rows[0]['type'], device_type)
+
+    def test_list_devices_without_auth(self):
+        response = requests.get('http://localhost:8000/devices')
+        self.assertEqual(response.status_code, 401)
+
+    def test_bulk_device_operations(self):
+        other_token = self.fetch_auth_token("testuser2@example.com", "testpassword")
+        foreign_response = requests.post('http://localhost:8000/device', json={
+            "name": "Foreign",
+            "type": "Sensor",
+            "login": "device_login",
+            "password": "device_pass",
+        }, headers={'Authorization': f'Bearer {other_token}'})
+        foreign_id = foreign_response.json()['id']
+
+        create_response = requests.post('http://localhost:8000/devices/bulk', json={"operations": [
+            {"op": "create", "data": {"name": "Bulk1", "type": "Sensor", "login": "l", "password": "p"}},
+            {"op": "create", "data": {"name": "Bulk2", "type": "Sensor", "login": "l", "password": "p"}},
+            {"op": "create", "data": {"name": "Bulk3"}},
+        ]}, headers={'Authorization': f'Bearer {self.token}'})
+        self.assertEqual(create_response.status_code, 200)
+        created = create_response.json()['results']
+        self.assertEqual([r['status'] for r in created], [201, 201, 400])
+        first_id, second_id = created[0]['device']['id'], created[1]['device']['id']
+
+        response = requests.post('http://localhost:8000/devices/bulk', json={"operations": [
+            {"op": "update", "id": first_id, "data": {"name": "Bulk1 renamed"}},
+            {"op": "update", "id": foreign_id, "data": {"name": "Hijacked"}},
+            {"op": "delete", "id": second_id},
+        ]}, headers={'Authorization': f'Bearer {self.token}'})
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual([r['status'] for r in results], [200, 404, 200])
+        self.assertEqual(results[0]['device']['name'], "Bulk1 renamed")
+
+        read_response = requests.get(f'http://localhost:8000/device/{second_id}',
+                                     headers={'Authorization': f'Bearer {self.token}'})
+        self.assertEqual(read_response.status_code, 404)
+        foreign_read = requests.get(f'http://localhost:8000/device/{foreign_id}',
+                                    headers={'Authorization': f'Bearer {other_token}'})
+        self.assertEqual(foreign_read.json()['name'], "Foreign")
+
+    def test_post_telemetry(self):
+        create_response = requests.post('http://localhost:8000/device', json={
+            "name": "Device1",
+            "type": "Sensor",
+            "login": "device_login",
+            "password": "device_pass",
+        }, headers={'Authorization': f'Bearer {self.token}'})
+        device_id = create_response.json()['id']
+        headers = {'Authorization': f'Bearer {self.token}'}
+
+        response = requests.post(f'http://localhost:8000/device/{device_id}/telemetry', json=[
+            {"metric": "temperature", "value": 21.5},
+            {"metric": "humidity", "value": 40, "recorded_at": "2024-01-01T00:00:00Z"},
+        ], headers=headers)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['accepted'], 2)
+
+        batch = '{"metric": "temperature", "value": 21.5}\n{"metric": "temperature", "value": 22}\n'
+        response = requests.post(f'http://localhost:8000/device/{device_id}/telemetry/batch', data=batch,
+                                 headers={**headers, 'Content-Type': 'application/x-ndjson'})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['accepted'], 2)
+
+        response = requests.post(f'http://localhost:8000/device/{device_id}/telemetry/batch',
+                                 data='{"metric": "temperature", "value": 1}\nnot json\n', headers=headers)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['line'], 2)
+
+    def test_post_telemetry_for_other_users_device(self):
+        other_token = self.fetch_auth_token("testuser2@example.com", "testpassword")
+        create_response = requests.post('http://localhost:8000/device', json={
+            "name": "Device1",
+            "type": "Sensor",
+            "login": "device_login",
+            "password": "device_pass",
+        }, headers={'Authorization': f'Bearer {self.token}'})
+        device_id = create_response.json()['id']
+        response = requests.post(f'http://localhost:8000/device/{device_id}/telemetry', json={
+            "metric": "temperature", "value": 21.5
+        }, headers={'Authorization': f'Bearer {other_token}'})
+        self.assertEqual(response.status_code, 403)
+
+    def test_device_feed_pushes_changes(self):
+        async def run():
+            headers = {'Authorization': f'Bearer {self.token}'}
+            async with aiohttp.ClientSession() as session:
+                async with session.ws_connect('http://localhost:8000/devices/feed', headers=headers) as ws:
+                    await asyncio.sleep(0.5)
+                    async with session.post('http://localhost:8000/device', json={
+                        "name": "FeedDevice",
+                        "type": "Sensor",
+                        "login": "device_login",
+                        "password": "device_pass",
+                    }, headers=headers) as response:
+                        device_id = (await response.json())['id']
+                    created = await ws.receive_json(timeout=5)
+                    async with session.delete(f'http://localhost:8000/device/{device_id}', headers=headers):
+                        pass
+                    deleted = await ws.receive_json(timeout=5)
+                    return device_id, created, deleted
+
+        device_id, created, deleted = asyncio.run(run())
+        self.assertEqual(created['event'], 'created')
+        self.assertEqual(created['device']['id'], device_id)
+        self.assertEqual(deleted, {'event': 'deleted', 'id': device_id})
+
+    def test_device_feed_without_auth(self):
+        response = requests.get('http://localhost:8000/devices/feed')
+        self.assertEqual(response.status_code, 401)
+
+    def test_conditional_read(self):
+        headers = {'Authorization': f'Bearer {self.token}'}
+        device = requests.post('http://localhost:8000/device', json={
+            "name": "Polled", "type": "Sensor", "login": "l", "password": "p"}, headers=headers)
+        etag = device.headers['ETag']
+        url = f"http://localhost:8000/device/{device.json()['id']}"
+
+        response = requests.get(url, headers={**headers, 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response.headers['ETag'], etag)
+
+        requests.put(url, json={"name": "Polled 2"}, headers=headers)
+        response = requests.get(url, headers={**headers, 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+        self.assertEqual(response.json()['name'], "Polled 2")
+
+    def test_update_is_seen_through_a_non_canonical_id(self):
+        headers = {'Authorization': f'Bearer {self.token}'}
+        device = requests.post('http://localhost:8000/device', json={
+            "name": "Padded", "type": "Sensor", "login": "l", "password": "p"}, headers=headers)
+        etag = device.headers['ETag']
+        padded_url = f"http://localhost:8000/device/00{device.json()['id']}"
+        self.assertEqual(requests.get(padded_url, headers=headers).json()['name'], "Padded")
+
+        response = requests.put(f"http://localhost:8000/device/{device.json()['id']}",
+                                json={"name": "Renamed"}, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        response = requests.get(padded_url, headers=headers)
+        self.assertEqual(response.json()['name'], "Renamed")
+        self.assertNotEqual(response.headers['ETag'], etag)
+        response = requests.get(padded_url, headers={**headers, 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+
+    def test_optimistic_update(self):
+        headers = {'Authorization': f'Bearer {self.token}'}
+        device = requests.post('http://localhost:8000/device', json={
+            "name": "Shared", "type": "Sensor", "login": "l", "password": "p"}, headers=headers)
+        etag = device.headers['ETag']
+        url = f"http://localhost:8000/device/{device.json()['id']}"
+
+        response = requests.put(url, json={"name": "First"}, headers={**headers, 'If-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['version'], device.json()['version'] + 1)
+        new_etag = response.headers['ETag']
+
+        # A second writer still holding the old ETag must not overwrite it.
+        response = requests.put(url, json={"name": "Second"}, headers={**headers, 'If-Match': etag})
+        self.assertEqual(response.status_code, 412)
+        self.assertEqual(response.headers['ETag'], new_etag)
+        self.assertEqual(requests.get(url, headers=headers).json()['name'], "First")
+
+        # However many tags If-Match lists, it is one compiled statement; a
+        # tag beyond the version column's range just doesn't match.
+        response = requests.put(url, json={"name": "Huge"}, headers={**headers, 'If-Match': '"99999999999"'})
+        self.assertEqual(response.status_code, 412)
+        response = requests.put(url, json={"name": "Third"},
+                                headers={**headers, 'If-Match': f'"99999999999", {etag}, {new_etag}'})
+        self.assertEqual(response.status_code, 200)
+        metrics = requests.get('http://localhost:8000/metrics').text
+        shapes = re.search(r'^app_compiled_queries_shapes (\S+)$', metrics, re.M).group(1)
+        response = requests.put(url, json={"name": "Fourth"},
+                                headers={**headers, 'If-Match': f'"1", "2", "3", {response.headers["ETag"]}'})
+        self.assertEqual(response.status_code, 200)
+        metrics = requests.get('http://localhost:8000/metrics').text
+        self.assertEqual(re.search(r'^app_compiled_queries_shapes (\S+)$', metrics, re.M).group(1), shapes)
+
+        response = requests.put('http://localhost:8000/device/999999999', json={"name": "x"},
+                                headers={**headers, 'If-Match': etag})
+        self.assertEqual(response.status_code, 404)
+
+    def test_response_compression(self):
+        headers = {'Authorization': f'Bearer {self.token}'}
+        requests.post('http://localhost:8000/devices/bulk', headers=headers, json={'operations': [
+            {'op': 'create', 'data': {"name": f"Bulk{i}", "type": "Sensor", "login": "l", "password": "p"}}
+            for i in range(20)
+        ]})
+        response = requests.get('http://localhost:8000/devices', params={'limit': 20},
+                                headers={**headers, 'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.headers['Vary'], 'Accept-Encoding')
+        self.assertEqual(len(response.json()['devices']), 20)
+
+        response = requests.get('http://localhost:8000/devices', params={'limit': 20},
+                                headers={**headers, 'Accept-Encoding': 'identity'})
+        self.assertNotIn('Content-Encoding', response.headers)
+
+        # Single devices stay below the size threshold.
+        device_id = response.json()['devices'][0]['id']
+        response = requests.get(f'http://localhost:8000/device/{device_id}',
+                                headers={**headers, 'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', response.headers)
+
+        response = requests.get('http://localhost:8000/devices/export',
+                                headers={**headers, 'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertGreaterEqual(len(response.text.splitlines()), 20)
+
+    def test_location_crud(self):
+        headers = {'Authorization': f'Bearer {self.token}'}
+        response = requests.post('http://localhost:8000/location', json={"name": "Lab"}, headers=headers)
+        self.assertEqual(response.status_code, 201)
+        location_id = response.json()['id']
+
+        response = requests.put(f'http://localhost:8000/location/{location_id}', json={"name": "Lab 2"},
+                                headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['name'], "Lab 2")
+        response = requests.get(f'http://localhost:8000/location/{location_id}', headers=headers)
+        self.assertEqual(response.json(), {'id': location_id, 'name': "Lab 2"})
+        response = requests.get('http://localhost:8000/locations', params={'cursor': location_id - 1, 'limit': 1},
+                                headers=headers)
+        self.assertEqual(response.json()['locations'], [{'id': location_id, 'name': "Lab 2"}])
+
+        response = requests.delete(f'http://localhost:8000/location/{location_id}', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        response = requests.get(f'http://localhost:8000/location/{location_id}', headers=headers)
+        self.assertEqual(response.status_code, 404)
+
+    def test_location_device_counts(self):
+        headers = {'Authorization': f'Bearer {self.token}'}
+        location_id = requests.post('http://localhost:8000/location', json={"name": "Site"},
+                                    headers=headers).json()['id']
+        counts_url = f'http://localhost:8000/location/{location_id}/device-counts'
+        self.assertEqual(requests.get(counts_url, headers=headers).json(),
+                         {'location_id': location_id, 'counts': {}, 'total': 0})
+
+        device = {"login": "l", "password": "p", "location_id": str(location_id)}
+        sensor = requests.post('http://localhost:8000/device', json={**device, "name": "s", "type": "Sensor"},
+                               headers=headers).json()
+        requests.post('http://localhost:8000/devices/bulk', headers=headers, json={'operations': [
+            {'op': 'create', 'data': {**device, "name": "g1", "type": "Gateway"}},
+            {'op': 'create', 'data': {**device, "name": "g2", "type": "Gateway"}},
+        ]})
+        self.assertEqual(requests.get(counts_url, headers=headers).json()['counts'], {'Sensor': 1, 'Gateway': 2})
+
+        requests.put(f"http://localhost:8000/device/{sensor['id']}", json={"type": "Gateway"}, headers=headers)
+        self.assertEqual(requests.get(counts_url, headers=headers).json()['counts'], {'Gateway': 3})
+
+        response = requests.get('http://localhost:8000/locations/device-counts', headers=headers)
+        entry = [e for e in response.json()['locations'] if e['location_id'] == location_id][0]
+        self.assertEqual(entry, {'location_id': location_id, 'name': 'Site', 'counts': {'Gateway': 3}, 'total': 3})
+
+        # Deleting the location also removes the caller's devices there.
+        response = requests.delete(f'http://localhost:8000/location/{location_id}', headers=headers)
+        self.assertEqual(response.json(), {'status': 'success', 'deleted_devices': 3})
+        response = requests.get(f"http://localhost:8000/device/{sensor['id']}", headers=headers)
+        self.assertEqual(response.status_code, 404)
+
+    def test_delete_location_with_other_users_devices(self):
+        headers = {'Authorization': f'Bearer {self.token}'}
+        other_token = self.fetch_auth_token(f"{uuid.uuid4().hex}@example.com", "otherpassword")
+        location_id = requests.post('http://localhost:8000/location', json={"name": "Shared"},
+                                    headers=headers).json()['id']
+        requests.post('http://localhost:8000/device', headers={'Authorization': f'Bearer {other_token}'}, json={
+            "name": "d", "type": "Sensor", "login": "l", "password": "p", "location_id": str(location_id)})
+        response = requests.delete(f'http://localhost:8000/location/{location_id}', headers=headers)
+        self.assertEqual(response.status_code, 409)
+
+    def test_metrics(self):
+        headers = {'Authorization': f'Bearer {self.token}'}
+        requests.get('http://localhost:8000/devices', headers=headers)
+        response = requests.get('http://localhost:8000/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers['Content-Type'].startswith('text/plain'))
+        text = response.text
+        self.assertIn('app_http_requests_total{method="GET",route="/devices",status="2xx"}', text)
+        self.assertIn('app_http_request_duration_seconds_bucket{method="GET",route="/devices",le="+Inf"}', text)
+        self.assertIn('app_http_request_db_queries_count{method="GET",route="/devices"}', text)
+        self.assertIn('app_db_pool_in_use', text)
+        self.assertIn('app_device_cache_hit_ratio', text)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+
+from app.db.device_cache import DeviceCache
+
+
+class DeviceCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.cache = DeviceCache(max_size=2, ttl=60)
+
+    def test_read_through_and_invalidate(self):
+        self.assertIsNone(self.cache.lookup(1))
+        self.cache.put(1, 7, 1, b'{"id": 1}', self.cache.generation)
+        self.assertEqual(self.cache.lookup('1'), (7, 1, b'{"id": 1}'))
+        self.cache.invalidate(1)
+        self.assertIsNone(self.cache.lookup(1))
+        stats = self.cache.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 2)
+        self.assertEqual(stats['invalidations'], 1)
+
+    def test_non_canonical_id_shares_the_entry(self):
+        cache = DeviceCache(max_size=2, ttl=60, replica_window=60)
+        cache.put('005962', 7, 1, b'{"id": 5962}', cache.generation)
+        self.assertEqual(cache.lookup(5962), (7, 1, b'{"id": 5962}'))
+        cache.invalidate(5962)
+        self.assertIsNone(cache.lookup('005962'))
+        self.assertTrue(cache.recently_invalidated('05962'))
+        self.assertIsNone(cache.lookup('abc'))
+
+    def test_fill_racing_an_invalidation_is_dropped(self):
+        generation = self.cache.generation
+        self.cache.invalidate(1)
+        self.cache.put(1, 7, 1, b'{"id": 1}', generation)
+        self.assertIsNone(self.cache.lookup(1))
+
+    def test_invalidated_device_is_remembered_for_the_replica_window(self):
+        cache = DeviceCache(max_size=2, ttl=60, replica_window=60)
+        cache.invalidate(1)
+        self.assertTrue(cache.recently_invalidated('1'))
+        self.assertFalse(cache.recently_invalidated(2))
+        expired = DeviceCache(max_size=2, ttl=60, replica_window=-1)
+        expired.invalidate(1)
+        self.assertFalse(expired.recently_invalidated(1))
+
+    def test_expired_entry_is_a_miss(self):
+        cache = DeviceCache(max_size=2, ttl=-1)
+        cache.put(1, 7, 1, b'{"id": 1}', cache.generation)
+        self.assertIsNone(cache.lookup(1))
+        self.assertEqual(cache.stats()['expired'], 1)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        for device_id in (1, 2, 3):
+            self.cache.put(device_id, 7, 1, b'{}', self.cache.generation)
+        self.assertIsNone(self.cache.lookup(1))
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
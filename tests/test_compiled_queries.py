@@ -0,0 +1,46 @@
+import unittest
+
+from app.db.compiled_queries import CompiledQuery, QueryCache, param
+from app.models.model import Device
+
+
+class CompiledQueryTestCase(unittest.TestCase):
+    def setUp(self):
+        query = (Device.update({Device.name: param(Device.name), Device.version: Device.version + 1})
+                 .where(Device.id == param(Device.id))
+                 .returning(*Device._meta.sorted_fields))
+        self.compiled = CompiledQuery('compiled_test', query)
+
+    def test_binds_values_through_the_fields(self):
+        self.assertEqual(self.compiled.bind({'name': 7, 'id': '3'}), ['7', 1, 3])
+
+    def test_prepared_form_numbers_the_placeholders(self):
+        self.assertIn('"name" = $1', self.compiled.prepare_sql)
+        self.assertIn('"version" + $2', self.compiled.prepare_sql)
+        self.assertIn('"id" = $3', self.compiled.prepare_sql)
+        self.assertEqual(self.compiled.execute_sql, 'EXECUTE compiled_test(%s, %s, %s)')
+
+    def test_rows_become_clean_instances(self):
+        device = self.compiled.instance((3, 'Device1', 'Sensor', 'login', 'password', None, 7, 2))
+        self.assertEqual((device.id, device.name, device.api_user_id_id, device.version), (3, 'Device1', 7, 2))
+        self.assertFalse(device.is_dirty())
+
+
+class QueryCacheTestCase(unittest.TestCase):
+    def test_builds_each_shape_once(self):
+        cache = QueryCache(prepared_statements=False)
+        built = []
+
+        def build():
+            built.append(1)
+            return Device.select().where(Device.id == param(Device.id))
+
+        first = cache.compile(('get', Device), build)
+        self.assertIs(cache.compile(('get', Device), build), first)
+        self.assertEqual(len(built), 1)
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['shapes']), (1, 1, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,28 @@
+import gzip
+import unittest
+
+from app.utils.compression import ENCODERS, STREAM_CODINGS, negotiate_encoding, parse_accept_encoding
+
+
+class CompressionTestCase(unittest.TestCase):
+    def test_parse_accept_encoding(self):
+        self.assertEqual(parse_accept_encoding('gzip, br;q=0.5, *;q=0'),
+                         {'gzip': 1.0, 'br': 0.5, '*': 0.0})
+
+    def test_negotiation_follows_client_preference(self):
+        self.assertEqual(negotiate_encoding('deflate;q=0.9, gzip'), 'gzip')
+        self.assertEqual(negotiate_encoding('gzip;q=0, identity'), None)
+        self.assertIsNone(negotiate_encoding(''))
+        self.assertIsNone(negotiate_encoding('unknown'))
+
+    def test_ties_go_to_the_first_supported_coding(self):
+        self.assertEqual(negotiate_encoding('deflate, gzip', ('gzip', 'deflate')), 'gzip')
+        self.assertEqual(negotiate_encoding('*', STREAM_CODINGS), 'gzip')
+
+    def test_gzip_round_trip(self):
+        data = b'{"id": 1}' * 100
+        self.assertEqual(gzip.decompress(ENCODERS['gzip'](data)), data)
+
+
+if __name__ == '__main__':
+    unittest.main()
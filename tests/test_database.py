@@ -0,0 +1,57 @@
+import asyncio
+import unittest
+import uuid
+
+from peewee_async import Manager
+
+from app.core.config import db_settings
+from app.db.database import PoolAcquireTimeout, StatsPooledPostgresqlDatabase
+from app.models.model import Location
+
+
+class PoolAcquireTimeoutTestCase(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.database = StatsPooledPostgresqlDatabase(
+            database=db_settings.db_name,
+            user=db_settings.db_user,
+            password=db_settings.db_pass,
+            host=db_settings.db_host,
+            port=db_settings.db_port,
+            min_connections=1,
+            max_connections=1,
+            acquire_timeout=0.2,
+        )
+        self.database.set_allow_sync(False)
+        self.objects = Manager(self.database)
+
+    async def asyncTearDown(self):
+        await self.objects.close()
+
+    async def test_timeout_next_to_a_transaction_keeps_it_atomic(self):
+        name = f'pool-timeout-{uuid.uuid4().hex}'
+        in_transaction = asyncio.Event()
+        timed_out = asyncio.Event()
+
+        async def transaction():
+            async with self.objects.atomic():
+                await self.objects.create(Location, name=name)
+                in_transaction.set()
+                await timed_out.wait()
+                await self.objects.create(Location, name=name)
+                raise RuntimeError("roll back")
+
+        task = asyncio.ensure_future(transaction())
+        await in_transaction.wait()
+        # The only connection is held by the transaction.
+        with self.assertRaises(PoolAcquireTimeout):
+            await self.objects.count(Location.select())
+        timed_out.set()
+        with self.assertRaises(RuntimeError):
+            await task
+
+        self.assertEqual(await self.objects.count(Location.select().where(Location.name == name)), 0)
+        self.assertEqual(self.database._async_conn.stats()['acquire_timeouts'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import asyncio
+import unittest
+
+import peewee
+
+from app.db.loaders import BatchLoader
+from app.models.model import Device
+
+
+class FakeLoader(BatchLoader):
+    def __init__(self, existing, **kwargs):
+        super().__init__(Device, **kwargs)
+        self.existing = existing
+        self.rejected = set()
+        self.queries = []
+
+    async def _fetch(self, keys):
+        self.queries.append(sorted(keys))
+        await asyncio.sleep(0)
+        if any(key in self.rejected for key in keys):
+            raise peewee.DataError("integer out of range")
+        return [Device(id=key, name=f'Device{key}') for key in keys if key in self.existing]
+
+
+class BatchLoaderTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_coalesces_and_dedupes_lookups(self):
+        loader = FakeLoader({1, 2, 3}, window=0, max_batch=100)
+        devices = await asyncio.gather(loader.load(1), loader.load('2'), loader.load(1), loader.load(3))
+        self.assertEqual([device.id for device in devices], [1, 2, 1, 3])
+        self.assertEqual(loader.queries, [[1, 2, 3]])
+        stats = loader.stats()
+        self.assertEqual((stats['loads'], stats['deduped'], stats['batches']), (4, 1, 1))
+        self.assertEqual(stats['inflight'], 0)
+
+    async def test_missing_key_raises_does_not_exist(self):
+        loader = FakeLoader({1}, window=0, max_batch=100)
+        results = await asyncio.gather(loader.load(1), loader.load(2), return_exceptions=True)
+        self.assertEqual(results[0].id, 1)
+        self.assertIsInstance(results[1], Device.DoesNotExist)
+
+    async def test_invalid_key_fails_only_its_caller(self):
+        loader = FakeLoader({1, 2}, window=0, max_batch=100)
+        results = await asyncio.gather(loader.load(1), loader.load('abc'), loader.load('2'),
+                                       return_exceptions=True)
+        self.assertEqual(results[0].id, 1)
+        self.assertIsInstance(results[1], Device.DoesNotExist)
+        self.assertEqual(results[2].id, 2)
+        self.assertEqual(loader.queries, [[1, 2]])
+
+    async def test_out_of_range_key_fails_only_its_caller(self):
+        loader = FakeLoader({1}, window=0, max_batch=100)
+        results = await asyncio.gather(loader.load(1), loader.load(2 ** 31), return_exceptions=True)
+        self.assertEqual(results[0].id, 1)
+        self.assertIsInstance(results[1], Device.DoesNotExist)
+        self.assertEqual(loader.queries, [[1]])
+
+    async def test_rejected_batch_is_retried_key_by_key(self):
+        loader = FakeLoader({1, 2}, window=0, max_batch=100)
+        loader.rejected.add(3)
+        results = await asyncio.gather(loader.load(1), loader.load(3), loader.load(2), return_exceptions=True)
+        self.assertEqual(results[0].id, 1)
+        self.assertIsInstance(results[1], peewee.DataError)
+        self.assertEqual(results[2].id, 2)
+        self.assertEqual(loader.queries, [[1, 2, 3], [1], [3], [2]])
+        self.assertEqual(loader.stats()['split_batches'], 1)
+
+    async def test_full_batch_is_sent_without_waiting_for_the_window(self):
+        loader = FakeLoader({1, 2, 3}, window=60, max_batch=2)
+        first = asyncio.gather(loader.load(1), loader.load(2))
+        await asyncio.wait_for(first, 1)
+        self.assertEqual(loader.queries, [[1, 2]])
+
+    async def test_forgotten_key_is_fetched_again(self):
+        loader = FakeLoader({1}, window=0, max_batch=100)
+        first = asyncio.ensure_future(loader.load(1))
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        loader.forget(1)
+        second = asyncio.ensure_future(loader.load(1))
+        await asyncio.gather(first, second)
+        self.assertEqual(loader.queries, [[1], [1]])
+
+
+if __name__ == '__main__':
+    unittest.main()
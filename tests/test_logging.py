@@ -0,0 +1,36 @@
+import json
+import logging
+import queue
+import unittest
+
+from app.core.logging_config import JsonFormatter, NonBlockingQueueHandler, parse_levels
+
+
+class LoggingConfigTestCase(unittest.TestCase):
+    def test_full_queue_drops_instead_of_blocking(self):
+        handler = NonBlockingQueueHandler(queue.Queue(maxsize=1))
+        record = logging.makeLogRecord({'msg': 'hello %s', 'args': ('world',)})
+        handler.handle(record)
+        handler.handle(record)
+        self.assertEqual(handler.dropped, 1)
+        queued = handler.queue.get_nowait()
+        # Formatting is left to the listener thread.
+        self.assertEqual(queued.args, ('world',))
+        self.assertEqual(queued.getMessage(), 'hello world')
+
+    def test_json_formatter_merges_fields(self):
+        record = logging.makeLogRecord({'name': 'app.access', 'levelname': 'INFO', 'msg': 'GET %s',
+                                        'args': ('/devices',), 'fields': {'status': 200}})
+        entry = json.loads(JsonFormatter().format(record))
+        self.assertEqual(entry['message'], 'GET /devices')
+        self.assertEqual(entry['logger'], 'app.access')
+        self.assertEqual(entry['status'], 200)
+
+    def test_parse_levels(self):
+        self.assertEqual(parse_levels('peewee=warning, aiohttp.access=INFO,'),
+                         {'peewee': 'WARNING', 'aiohttp.access': 'INFO'})
+        self.assertEqual(parse_levels(''), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
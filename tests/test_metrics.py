@@ -0,0 +1,38 @@
+import unittest
+
+from app.utils.metrics import MetricsRegistry
+
+
+class MetricsRegistryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.registry = MetricsRegistry()
+
+    def test_counter_renders_labels(self):
+        counter = self.registry.counter('requests_total', 'Requests', ('route', 'status'))
+        counter.inc(('/device/{id}', '2xx'))
+        counter.inc(('/device/{id}', '2xx'))
+        text = self.registry.render()
+        self.assertIn('# TYPE requests_total counter', text)
+        self.assertIn('requests_total{route="/device/{id}",status="2xx"} 2', text)
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = self.registry.histogram('latency_seconds', 'Latency', buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            histogram.observe(value)
+        lines = self.registry.render().splitlines()
+        self.assertIn('latency_seconds_bucket{le="0.1"} 2', lines)
+        self.assertIn('latency_seconds_bucket{le="1"} 3', lines)
+        self.assertIn('latency_seconds_bucket{le="+Inf"} 4', lines)
+        self.assertIn('latency_seconds_sum 3.65', lines)
+        self.assertIn('latency_seconds_count 4', lines)
+
+    def test_stats_sources_skip_non_numeric_values(self):
+        self.registry.add_stats_source('cache', 'Cache', lambda: {'hits': 3, 'hit_ratio': 0.5, 'name': 'x'})
+        text = self.registry.render()
+        self.assertIn('cache_hits 3', text)
+        self.assertIn('cache_hit_ratio 0.5', text)
+        self.assertNotIn('cache_name', text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import os
+import subprocess
+import time
+import unittest
+
+import psycopg2
+
+from app.core.config import db_settings
+
+MIGRATE = ["python", "migrations/migrate.py"]
+
+
+def run_migrate(**env):
+    return subprocess.Popen(MIGRATE, env=dict(os.environ, **env), stdout=subprocess.PIPE,
+                            stderr=subprocess.STDOUT, text=True)
+
+
+class MigrateTestCase(unittest.TestCase):
+    def test_unchanged_schema_skips_generation(self):
+        # The first run brings the schema up to date if it isn't already.
+        self.assertEqual(run_migrate().wait(timeout=60), 0)
+        process = run_migrate()
+        output, _ = process.communicate(timeout=60)
+        self.assertEqual(process.returncode, 0)
+        self.assertIn("Schema unchanged, skipping migration generation.", output)
+
+    def test_waits_for_the_lock_past_the_statement_timeout(self):
+        connection = psycopg2.connect(dbname=db_settings.db_name, user=db_settings.db_user,
+                                      password=db_settings.db_pass, host=db_settings.db_host,
+                                      port=db_settings.db_port)
+        connection.autocommit = True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_lock(hashtext('migrations'))")
+            process = run_migrate(DB_STATEMENT_TIMEOUT='200')
+            time.sleep(1.5)
+            # Still waiting for the lock, not cancelled by the timeout.
+            self.assertIsNone(process.poll())
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_unlock(hashtext('migrations'))")
+            output, _ = process.communicate(timeout=60)
+            self.assertEqual(process.returncode, 0, output)
+        finally:
+            connection.close()
+
+    def test_failure_exits_non_zero(self):
+        process = run_migrate(DB_NAME='no_such_database')
+        output, _ = process.communicate(timeout=60)
+        self.assertEqual(process.returncode, 1)
+        self.assertIn("An error occurred during the migration process", output)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+import time
+import unittest
+import uuid
+
+from aiohttp import web
+
+from app.auth.jwt_token import create_token_pair, decode_jwt_token
+from app.auth.revocation import RevocationList
+
+
+class RevocationListTestCase(unittest.TestCase):
+    def test_revoked_until_expiry(self):
+        revocations = RevocationList(sync_interval=1)
+        revoked, expired = uuid.uuid4().hex, uuid.uuid4().hex
+        revocations._add(revoked, time.time() + 60)
+        revocations._add(expired, time.time() - 1)
+        self.assertTrue(revocations.is_revoked(revoked))
+        self.assertFalse(revocations.is_revoked(expired))
+        self.assertFalse(revocations.is_revoked(uuid.uuid4().hex))
+        self.assertFalse(revocations.is_revoked(None))
+
+
+class TokenPairTestCase(unittest.TestCase):
+    def test_tokens_share_a_family_and_are_typed(self):
+        tokens = create_token_pair(7)
+        access = decode_jwt_token(tokens['token'])
+        refresh = decode_jwt_token(tokens['refresh_token'], token_type='refresh')
+        self.assertEqual(access['fam'], refresh['fam'])
+        self.assertEqual(refresh['user_id'], 7)
+        self.assertIn('jti', refresh)
+        with self.assertRaises(web.HTTPUnauthorized):
+            decode_jwt_token(tokens['refresh_token'])
+        with self.assertRaises(web.HTTPUnauthorized):
+            decode_jwt_token(tokens['token'], token_type='refresh')
+
+
+if __name__ == '__main__':
+    unittest.main()
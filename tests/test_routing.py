@@ -0,0 +1,95 @@
+import time
+import unittest
+
+from app.db.routing import ReplicaRouter
+
+
+class UnreachableDatabase:
+    async def cursor_async(self):
+        raise ConnectionError("replica is down")
+
+
+class UnreachableReplica:
+    database = UnreachableDatabase()
+
+
+class LagCursor:
+    def __init__(self, lag):
+        self.lag = lag
+
+    async def execute(self, sql):
+        pass
+
+    async def fetchone(self):
+        return (self.lag,)
+
+    async def release(self):
+        pass
+
+
+class LagDatabase:
+    def __init__(self, lag):
+        self.lag = lag
+
+    async def cursor_async(self):
+        return LagCursor(self.lag)
+
+
+class LagReplica:
+    def __init__(self, lag):
+        self.database = LagDatabase(lag)
+
+
+class ReplicaRouterTestCase(unittest.IsolatedAsyncioTestCase):
+    def test_reads_go_to_a_healthy_replica(self):
+        router = ReplicaRouter(UnreachableReplica(), max_lag=5, check_interval=1, read_your_writes_window=60)
+        self.assertFalse(router.use_replica(1))
+        router.healthy = True
+        self.assertTrue(router.use_replica(1))
+        self.assertTrue(router.use_replica(None))
+
+    def test_recent_writer_reads_from_the_primary(self):
+        router = ReplicaRouter(UnreachableReplica(), max_lag=5, check_interval=1, read_your_writes_window=60)
+        router.healthy = True
+        router.note_write(1)
+        self.assertFalse(router.use_replica(1))
+        self.assertTrue(router.use_replica(2))
+        self.assertEqual(router.counters['read_your_writes'], 1)
+
+    def test_last_write_from_the_client_reads_from_the_primary(self):
+        router = ReplicaRouter(UnreachableReplica(), max_lag=5, check_interval=1, read_your_writes_window=60)
+        router.healthy = True
+        # Written through another worker: this one never saw the user write.
+        self.assertFalse(router.use_replica(1, time.time() - 1))
+        self.assertTrue(router.use_replica(1, time.time() - 120))
+        self.assertTrue(router.use_replica(None, time.time() + 3600))
+
+    def test_read_your_writes_window_expires(self):
+        router = ReplicaRouter(UnreachableReplica(), max_lag=5, check_interval=1, read_your_writes_window=-1)
+        router.healthy = True
+        router.note_write(1)
+        self.assertTrue(router.use_replica(1))
+
+    async def test_check_uses_a_streaming_replica_within_the_lag(self):
+        router = ReplicaRouter(LagReplica(1.5), max_lag=5, check_interval=1, read_your_writes_window=60)
+        await router.check()
+        self.assertTrue(router.healthy)
+        self.assertEqual(router.lag, 1.5)
+
+    async def test_disconnected_replica_is_unhealthy(self):
+        router = ReplicaRouter(LagReplica(None), max_lag=5, check_interval=1, read_your_writes_window=60)
+        router.healthy = True
+        await router.check()
+        self.assertFalse(router.healthy)
+        self.assertEqual(router.counters['disconnected'], 1)
+
+    async def test_failed_check_marks_the_replica_unhealthy(self):
+        router = ReplicaRouter(UnreachableReplica(), max_lag=5, check_interval=1, read_your_writes_window=60)
+        router.healthy = True
+        await router.check()
+        self.assertFalse(router.healthy)
+        self.assertEqual(router.counters['check_failures'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
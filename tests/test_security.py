@@ -0,0 +1,70 @@
+import asyncio
+import signal
+import time
+import unittest
+
+from app.auth.security import HashingService, HashingQueueFull
+from app.auth.token_cache import TokenCache
+
+
+class HashingServiceTestCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.service = HashingService(workers=1, queue_size=1, rounds=4)
+
+    def tearDown(self):
+        self.service.close()
+
+    async def test_hash_and_verify(self):
+        password_hash = await self.service.hash("testpassword")
+        self.assertTrue(await self.service.verify("testpassword", password_hash))
+        self.assertFalse(await self.service.verify("wrongpassword", password_hash))
+        stats = self.service.stats()
+        self.assertEqual(stats['hash_calls'], 1)
+        self.assertEqual(stats['verify_calls'], 2)
+        self.assertGreater(stats['hash_seconds'], 0)
+
+    async def test_workers_leave_ctrl_c_to_the_parent(self):
+        handler = await self.service._run(signal.getsignal, signal.SIGINT)
+        self.assertEqual(handler, signal.SIG_IGN)
+
+    async def test_rejects_when_queue_is_full(self):
+        results = await asyncio.gather(
+            *(self.service.hash("testpassword") for _ in range(3)),
+            return_exceptions=True
+        )
+        rejected = [r for r in results if isinstance(r, HashingQueueFull)]
+        self.assertEqual(len(rejected), 1)
+        self.assertEqual(self.service.stats()['rejected'], 1)
+
+
+class TokenCacheTestCase(unittest.TestCase):
+    def test_hit_after_put(self):
+        cache = TokenCache(max_size=10)
+        payload = {'user_id': 1, 'exp': time.time() + 60}
+        self.assertIsNone(cache.get('token'))
+        cache.put('token', payload)
+        self.assertEqual(cache.get('token'), payload)
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_expired_entry_is_dropped(self):
+        cache = TokenCache(max_size=10)
+        cache.put('token', {'user_id': 1, 'exp': time.time() - 1})
+        self.assertIsNone(cache.get('token'))
+        self.assertEqual(cache.stats()['expired'], 1)
+        self.assertEqual(cache.stats()['size'], 0)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = TokenCache(max_size=2)
+        exp = time.time() + 60
+        cache.put('a', {'user_id': 1, 'exp': exp})
+        cache.put('b', {'user_id': 2, 'exp': exp})
+        cache.get('a')
+        cache.put('c', {'user_id': 3, 'exp': exp})
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('a'))
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
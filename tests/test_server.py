@@ -0,0 +1,55 @@
+import os
+import re
+import signal
+import subprocess
+import tempfile
+import time
+import requests
+import unittest
+
+PORT = 8001
+
+
+class SupervisorTestCase(unittest.TestCase):
+    def setUp(self):
+        self.log = tempfile.NamedTemporaryFile(mode='w+', suffix='.log')
+        env = dict(os.environ, LOG_LEVELS='app.access=WARNING,aiohttp.access=WARNING')
+        env.pop('HASH_POOL_WORKERS', None)
+        self.process = subprocess.Popen(
+            ["python", "-m", "app.server", "--workers", "2", "--port", str(PORT), "--shutdown-timeout", "5"],
+            stderr=self.log, env=env)
+        time.sleep(5)
+
+    def tearDown(self):
+        if self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+        self.log.close()
+
+    def worker_pids(self):
+        self.log.seek(0)
+        return re.findall(r'Started worker \d+ \(pid (\d+)\)', self.log.read())
+
+    def test_restarts_crashed_worker_and_drains_on_sigterm(self):
+        response = requests.get(f'http://localhost:{PORT}/devices')
+        self.assertEqual(response.status_code, 401)
+
+        # Each worker gets its share of the cores for its bcrypt pool.
+        metrics = requests.get(f'http://localhost:{PORT}/metrics').text
+        expected = max((os.cpu_count() or 1) // 2, 1)
+        self.assertIn(f'app_hashing_workers {expected}\n', metrics)
+
+        pids = self.worker_pids()
+        self.assertEqual(len(pids), 2)
+        os.kill(int(pids[0]), signal.SIGKILL)
+        time.sleep(3)
+        self.assertEqual(len(self.worker_pids()), 3)
+        response = requests.get(f'http://localhost:{PORT}/devices')
+        self.assertEqual(response.status_code, 401)
+
+        self.process.send_signal(signal.SIGTERM)
+        self.assertEqual(self.process.wait(timeout=15), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
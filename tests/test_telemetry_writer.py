@@ -0,0 +1,50 @@
+import unittest
+from datetime import datetime
+
+import peewee
+
+from app.db.telemetry_writer import TelemetryWriter
+
+
+class FakeWriter(TelemetryWriter):
+    def __init__(self, fail_with=None, **kwargs):
+        super().__init__(**kwargs)
+        self.fail_with = fail_with
+        self.inserted = []
+
+    async def _insert(self, rows):
+        if self.fail_with is not None:
+            raise self.fail_with
+        if any('\x00' in row[1] for row in rows):
+            raise ValueError("A string literal cannot contain NUL (0x00) characters.")
+        self.inserted.extend(rows)
+
+
+def _rows(*metrics):
+    return [(1, metric, 1.0, datetime(2024, 1, 1)) for metric in metrics]
+
+
+class TelemetryWriterTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_invalid_row_is_dropped_and_the_rest_written(self):
+        writer = FakeWriter(max_rows=100, flush_rows=100, flush_interval=1, insert_chunk=2)
+        writer.add(_rows('a', 'b\x00', 'c', 'd'))
+        await writer.flush()
+        self.assertEqual([row[1] for row in writer.inserted], ['a', 'c', 'd'])
+        stats = writer.stats()
+        self.assertEqual((stats['invalid'], stats['isolated_chunks'], stats['buffered']), (1, 1, 0))
+        self.assertEqual((stats['flushed_rows'], stats['flush_errors']), (3, 0))
+
+    async def test_transient_error_requeues_the_rows(self):
+        writer = FakeWriter(fail_with=peewee.OperationalError("connection lost"),
+                            max_rows=100, flush_rows=100, flush_interval=1, insert_chunk=2)
+        writer.add(_rows('a', 'b', 'c'))
+        await writer.flush()
+        self.assertEqual(writer.stats()['buffered'], 3)
+        writer.fail_with = None
+        await writer.flush()
+        self.assertEqual([row[1] for row in writer.inserted], ['a', 'b', 'c'])
+        self.assertEqual(writer.stats()['flush_errors'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()